@@ -0,0 +1,91 @@
+"""
+    Benchmark of triggering an event from several threads while other
+    threads keep registering and unregistering handlers, comparing
+    ThreadSafeObservable against an Observable guarded by a single lock.
+
+    Run it from the repository root with:
+
+        python -m benchmarks.contention
+"""
+
+import threading
+import time
+import typing as T
+
+from observable import Observable, ThreadSafeObservable
+
+
+READERS = 4
+WRITERS = 2
+TRIGGERS = 50000
+
+
+class LockedObservable(Observable):
+    """Naively thread-safe Observable taking one lock for everything."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._global_lock = threading.Lock()
+
+    def on(self, *args: T.Any, **kw: T.Any) -> T.Callable:
+        with self._global_lock:
+            return super().on(*args, **kw)
+
+    def off(self, *args: T.Any, **kw: T.Any) -> None:
+        with self._global_lock:
+            super().off(*args, **kw)
+
+    def trigger(self, *args: T.Any, **kw: T.Any) -> bool:
+        with self._global_lock:
+            return super().trigger(*args, **kw)
+
+
+def bench_contention(obs: Observable) -> float:
+    """Returns the total triggers per second of all reader threads."""
+
+    for _ in range(10):
+        obs.on("event", lambda *args: None)
+    done = threading.Event()
+
+    def churn() -> None:
+        def handler(*args: T.Any) -> None:
+            pass
+
+        while not done.is_set():
+            obs.on("event", handler)
+            obs.off("event", handler)
+            time.sleep(0.0001)
+
+    def trigger() -> None:
+        for _ in range(TRIGGERS):
+            obs.trigger("event", 42)
+
+    writers = [threading.Thread(target=churn) for _ in range(WRITERS)]
+    readers = [threading.Thread(target=trigger) for _ in range(READERS)]
+    for thread in writers:
+        thread.start()
+    start = time.perf_counter()
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in writers:
+        thread.join()
+    return READERS * TRIGGERS / elapsed
+
+
+def main() -> None:
+    """Prints the trigger throughput under contention for both variants."""
+
+    for name, factory in (
+            ("LockedObservable", LockedObservable),
+            ("ThreadSafeObservable", ThreadSafeObservable),
+    ):
+        print("{:>20}: {:>12,.0f} triggers/sec".format(
+            name, bench_contention(factory())))
+
+
+if __name__ == "__main__":
+    main()
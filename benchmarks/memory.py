@@ -0,0 +1,105 @@
+"""
+    Memory benchmark measuring the bytes allocated per Observable instance
+    with tracemalloc, both without handlers and with a handler before and
+    after the first trigger.
+
+    Run it from the repository root with:
+
+        python -m benchmarks.memory
+"""
+
+import tracemalloc
+import typing as T
+
+from observable import Observable
+
+
+INSTANCES = 10000
+
+
+class Model(Observable):
+    """Observable model without __slots__"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.value = 0
+
+
+class SlottedModel(Observable):
+    """Observable model with __slots__"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.value = 0
+
+
+class ClassHandledModel(SlottedModel):
+    """SlottedModel with a class-level handler"""
+
+    __slots__ = ()
+
+
+ClassHandledModel.on_class("event", print)
+
+
+def _listened_observable() -> Observable:
+    """Returns an Observable with a single handler."""
+
+    obs = Observable()
+    obs.on("event", print)
+    return obs
+
+
+def triggered_observable() -> Observable:
+    """Returns an Observable with a single handler, which was triggered
+    once, so the dispatcher of the event is cached."""
+
+    obs = Observable()
+    obs.on("event", id)
+    obs.trigger("event", obs)
+    return obs
+
+
+def _listened_model() -> SlottedModel:
+    """Returns a SlottedModel with a single handler."""
+
+    model = SlottedModel()
+    model.on("event", print)
+    return model
+
+
+def bytes_per_instance(factory: T.Callable[[], T.Any]) -> float:
+    """Returns the average number of bytes allocated per object created
+    by factory."""
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [factory() for _ in range(INSTANCES)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del instances
+    return (after - before) / INSTANCES
+
+
+def main() -> None:
+    """Prints the bytes per instance of different Observables."""
+
+    for name, factory in (
+            ("Observable", Observable),
+            ("Observable with a handler", _listened_observable),
+            ("Observable with a triggered handler", triggered_observable),
+            ("Model", Model),
+            ("SlottedModel", SlottedModel),
+            ("SlottedModel with a handler", _listened_model),
+            ("ClassHandledModel", ClassHandledModel),
+    ):
+        print("{:>36}: {:>6.0f} bytes/instance".format(
+            name, bytes_per_instance(factory)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+    Micro-benchmark comparing reads and writes of an ObservableProperty
+    with and without listeners against a builtin property.
+
+    Run it from the repository root with:
+
+        python -m benchmarks.property
+"""
+
+import typing as T
+
+from observable import Observable
+from observable.property import ObservableProperty
+
+from .timing import calls_per_second
+
+
+class PlainModel(Observable):
+    """Model with a builtin property"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._value = 0
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    @value.setter
+    def value(self, value: int) -> None:
+        self._value = value
+
+
+class ObservableModel(Observable):
+    """Model with an ObservableProperty"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._value = 0
+
+    @ObservableProperty
+    def value(self) -> int:
+        return self._value
+
+    @value.setter
+    def value(self, value: int) -> None:
+        self._value = value
+
+
+def _models() -> T.List[T.Tuple[str, Observable]]:
+    """Returns the models to benchmark with a description."""
+
+    listened = ObservableModel()
+    listened.on("after_set_value", lambda value: None)
+    return [
+        ("property", PlainModel()),
+        ("ObservableProperty, no listeners", ObservableModel()),
+        ("ObservableProperty, after_set listener", listened),
+    ]
+
+
+def main() -> None:
+    """Prints reads and writes per second for every model."""
+
+    for name, model in _models():
+
+        def read(model: T.Any = model) -> None:
+            model.value  # pylint: disable=pointless-statement
+
+        def write(model: T.Any = model) -> None:
+            model.value = 1
+
+        print("{:>40}: {:>12,.0f} reads/sec {:>12,.0f} writes/sec".format(
+            name, calls_per_second(read), calls_per_second(write)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+    Benchmark suite for the hot paths of Observable and ObservableProperty
+    with stored baselines.
+
+    Run it from the repository root with:
+
+        python -m benchmarks.suite run [--output baseline.json]
+        python -m benchmarks.suite compare baseline.json
+
+    compare runs the suite and exits with status 1 when a benchmark
+    regressed by more than the tolerance against the baseline. Timings
+    depend on the machine, so record the baseline on the machine
+    comparing against it (run --output) before changing the code.
+    Ratios divide two noisy timings and get a larger tolerance.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import typing as T
+
+from observable import Observable
+
+from .memory import SlottedModel, bytes_per_instance, triggered_observable
+from .property import ObservableModel, PlainModel
+from .timing import calls_per_second
+from .trigger import bench_dispatcher, bench_trigger
+
+
+#: number of handlers used by the registration benchmarks
+HANDLERS = 1000
+
+#: number of handlers of the event used to catch superlinear removals
+MANY_HANDLERS = 100000
+
+#: default relative tolerance of compare
+TOLERANCE = 0.25
+
+#: default relative tolerance of compare for ratios
+RATIO_TOLERANCE = 0.5
+
+#: units of the benchmark results and whether higher values are better
+UNITS = {"ops/sec": True, "bytes": False, "ratio": False}
+
+BENCHMARKS = []  # type: T.List[T.Tuple[str, str, T.Callable[[], float]]]
+
+
+def benchmark(name: str, unit: str) -> T.Callable[[T.Callable], T.Callable]:
+    """Decorator registering a function returning the result of a
+    benchmark in the given unit."""
+
+    def _register(func: T.Callable[[], float]) -> T.Callable[[], float]:
+        BENCHMARKS.append((name, unit, func))
+        return func
+
+    return _register
+
+
+def _ops_per_second(
+        setup: T.Callable[[], T.Any], run: T.Callable[[T.Any], None],
+        count: int, repeat: int = 5
+) -> float:
+    """Returns the best number of operations per second of run, which
+    performs count operations on the result of setup. setup isn't
+    timed."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        obj = setup()
+        start = time.perf_counter()
+        run(obj)
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def _handlers(count: int = HANDLERS) -> T.List[T.Callable]:
+    """Returns count distinct no-op handlers."""
+
+    return [lambda *args: None for _ in range(count)]
+
+
+@benchmark("on", "ops/sec")
+def bench_on() -> float:
+    """Registers handlers one by one."""
+
+    handlers = _handlers()
+
+    def _run(obs: Observable) -> None:
+        for handler in handlers:
+            obs.on("event", handler)
+
+    return _ops_per_second(Observable, _run, HANDLERS)
+
+
+def _bench_off(count: int, repeat: int = 5) -> float:
+    """Unregisters count handlers one by one from an event."""
+
+    handlers = _handlers(count)
+
+    def _setup() -> Observable:
+        obs = Observable()
+        obs.on("event", *handlers)
+        return obs
+
+    def _run(obs: Observable) -> None:
+        for handler in handlers:
+            obs.off("event", handler)
+
+    return _ops_per_second(_setup, _run, count, repeat)
+
+
+@benchmark("off, {} handlers".format(HANDLERS), "ops/sec")
+def bench_off() -> float:
+    """Unregisters handlers one by one from an event with many
+    handlers."""
+
+    return _bench_off(HANDLERS)
+
+
+@benchmark("off, {} handlers".format(MANY_HANDLERS), "ops/sec")
+def bench_off_many() -> float:
+    """Unregisters handlers one by one from an event with so many
+    handlers that removals which aren't O(1) stand out against the
+    benchmark with fewer handlers."""
+
+    return _bench_off(MANY_HANDLERS, repeat=3)
+
+
+@benchmark("once and trigger", "ops/sec")
+def bench_once() -> float:
+    """Registers a handler with once and triggers it."""
+
+    handlers = _handlers()
+
+    def _run(obs: Observable) -> None:
+        for handler in handlers:
+            obs.once("event", handler)
+            obs.trigger("event")
+
+    return _ops_per_second(Observable, _run, HANDLERS)
+
+
+def _register_trigger_benchmarks() -> None:
+    """Registers the trigger benchmarks for several handler counts."""
+
+    for count in (0, 1, 10, 100):
+        benchmark("trigger, {} handlers".format(count), "ops/sec")(
+            lambda count=count: bench_trigger(count))
+    benchmark("dispatcher, 1 handler", "ops/sec")(lambda: bench_dispatcher(1))
+
+
+_register_trigger_benchmarks()
+
+
+def _read(model: T.Any) -> T.Callable[[], None]:
+    """Returns a function reading the value of a model."""
+
+    def _get() -> None:
+        model.value  # pylint: disable=pointless-statement
+
+    return _get
+
+
+def _write(model: T.Any) -> T.Callable[[], None]:
+    """Returns a function writing the value of a model."""
+
+    def _set() -> None:
+        model.value = 1
+
+    return _set
+
+
+def _listened_model() -> ObservableModel:
+    """Returns an ObservableModel with an after_set listener."""
+
+    model = ObservableModel()
+    model.on("after_set_value", lambda value: None)
+    return model
+
+
+def _register_property_benchmarks() -> None:
+    """Registers the property benchmarks, both absolute and relative to
+    a builtin property."""
+
+    for name, factory in (
+            ("ObservableProperty", ObservableModel),
+            ("ObservableProperty with listener", _listened_model),
+    ):
+        for action, accessor in (("get", _read), ("set", _write)):
+
+            def _absolute(
+                    factory: T.Callable = factory, accessor: T.Callable = accessor
+            ) -> float:
+                return calls_per_second(accessor(factory()))
+
+            def _relative(
+                    factory: T.Callable = factory, accessor: T.Callable = accessor
+            ) -> float:
+                plain = calls_per_second(accessor(PlainModel()))
+                return plain / calls_per_second(accessor(factory()))
+
+            benchmark("{} {}".format(name, action), "ops/sec")(_absolute)
+            benchmark("{} {} / property {}".format(name, action, action),
+                      "ratio")(_relative)
+
+
+_register_property_benchmarks()
+
+
+def _listened_observable() -> Observable:
+    """Returns an Observable with a single handler."""
+
+    obs = Observable()
+    obs.on("event", print)
+    return obs
+
+
+@benchmark("memory per Observable", "bytes")
+def bench_memory() -> float:
+    """Measures the memory of an Observable without handlers."""
+
+    return bytes_per_instance(Observable)
+
+
+@benchmark("memory per Observable with a handler", "bytes")
+def bench_memory_handler() -> float:
+    """Measures the memory of an Observable with a handler."""
+
+    return bytes_per_instance(_listened_observable)
+
+
+@benchmark("memory per Observable with a triggered handler", "bytes")
+def bench_memory_triggered() -> float:
+    """Measures the memory of an Observable with a handler and the
+    cached dispatcher of its event."""
+
+    return bytes_per_instance(triggered_observable)
+
+
+@benchmark("memory per slotted model", "bytes")
+def bench_memory_model() -> float:
+    """Measures the memory of an Observable subclass with __slots__."""
+
+    return bytes_per_instance(SlottedModel)
+
+
+def run(pattern: str = None) -> T.Dict[str, T.Any]:
+    """Runs the benchmarks whose name contains pattern (or all of them)
+    and returns the results along with the platform they ran on."""
+
+    results = {}
+    for name, unit, func in BENCHMARKS:
+        if pattern is None or pattern in name:
+            results[name] = {"value": func(), "unit": unit}
+            print("{:>52}: {:>14,.2f} {}".format(name, results[name]["value"], unit))
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def compare(
+        baseline: T.Dict[str, T.Any], current: T.Dict[str, T.Any],
+        tolerance: float = TOLERANCE, ratio_tolerance: float = RATIO_TOLERANCE
+) -> T.List[str]:
+    """Compares the results of two runs and returns the names of the
+    benchmarks which got worse than the baseline by more than the
+    relative tolerance (ratio_tolerance for ratios). Benchmarks missing
+    in either run are skipped."""
+
+    regressions = []
+    for name, result in sorted(current["benchmarks"].items()):
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        change = result["value"] / base["value"] - 1
+        worse = -change if UNITS[result["unit"]] else change
+        allowed = ratio_tolerance if result["unit"] == "ratio" else tolerance
+        status = "REGRESSION" if worse > allowed else "ok"
+        if status != "ok":
+            regressions.append(name)
+        print("{:>52}: {:>14,.2f} -> {:>14,.2f} {:>8} ({:+.1%}) {}".format(
+            name, base["value"], result["value"], result["unit"], change, status))
+    return regressions
+
+
+def main(argv: T.List[str] = None) -> int:
+    """Runs the command line interface and returns the exit status."""
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument(
+        "-k", dest="pattern", help="only run benchmarks containing this")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", help="store the results as JSON file")
+    compare_parser = commands.add_parser(
+        "compare", help="run the benchmarks and compare them with a baseline")
+    compare_parser.add_argument("baseline", help="JSON file written by run")
+    compare_parser.add_argument(
+        "--tolerance", type=float, default=TOLERANCE,
+        help="allowed relative regression (default: %(default)s)")
+    compare_parser.add_argument(
+        "--ratio-tolerance", type=float, default=RATIO_TOLERANCE,
+        help="allowed relative regression of ratios (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print("Running benchmarks...")
+        current = run(args.pattern)
+        print("\nCompared with {} (Python {}):".format(
+            args.baseline, baseline["python"]))
+        regressions = compare(
+            baseline, current, args.tolerance, args.ratio_tolerance)
+        if regressions:
+            print("\n{} benchmark(s) regressed by more than {:.0%} ({:.0%} for "
+                  "ratios)".format(
+                      len(regressions), args.tolerance, args.ratio_tolerance))
+            return 1
+        return 0
+
+    results = run(args.pattern)
+    if getattr(args, "output", None):
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
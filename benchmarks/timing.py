@@ -0,0 +1,15 @@
+"""
+    Timing helpers shared by the benchmarks.
+"""
+
+import timeit
+import typing as T
+
+
+def calls_per_second(func: T.Callable[[], T.Any], repeat: int = 5) -> float:
+    """Returns the best number of calls per second of func."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
@@ -0,0 +1,69 @@
+"""
+    Micro-benchmark for Observable.trigger and a cached Observable.dispatcher
+    with a varying number of handlers.
+
+    Run it from the repository root with:
+
+        python -m benchmarks.trigger
+"""
+
+import typing as T
+
+from observable import Observable
+
+from .timing import calls_per_second
+
+
+HANDLER_COUNTS = (0, 1, 10, 100)
+
+
+def _make_handler() -> T.Callable:
+    """Returns a new, distinct no-op handler."""
+
+    def _handler(*args: T.Any, **kw: T.Any) -> None:
+        pass
+
+    return _handler
+
+
+def _observable(handler_count: int) -> Observable:
+    """Returns an Observable with handler_count handlers for "event"."""
+
+    obs = Observable()
+    for _ in range(handler_count):
+        obs.on("event", _make_handler())
+    return obs
+
+
+def bench_trigger(handler_count: int) -> float:
+    """Returns the best triggers per second for an event with
+    handler_count registered handlers."""
+
+    obs = _observable(handler_count)
+    return calls_per_second(lambda: obs.trigger("event", 42))
+
+
+def bench_dispatcher(handler_count: int) -> float:
+    """Returns the best calls per second of the cached dispatcher for an
+    event with handler_count registered handlers."""
+
+    dispatch = _observable(handler_count).dispatcher("event")
+    return calls_per_second(lambda: dispatch(42))
+
+
+def main() -> None:
+    """Prints the trigger and dispatcher throughput for every handler
+    count."""
+
+    for handler_count in HANDLER_COUNTS:
+        print(
+            "{:>4} handlers: {:>12,.0f} triggers/sec {:>12,.0f} dispatches/sec".format(
+                handler_count,
+                bench_trigger(handler_count),
+                bench_dispatcher(handler_count),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,22 @@
     Event system for python
 """
 
-from .core import Observable, EventNotFound, HandlerNotFound
+from .core import (
+    Observable,
+    ThreadSafeObservable,
+    WeakObservable,
+    DispatchError,
+    EventNotFound,
+    HandlerNotFound,
+    StopPropagation,
+)
 
-__all__ = ["Observable", "EventNotFound", "HandlerNotFound"]
+__all__ = [
+    "Observable",
+    "ThreadSafeObservable",
+    "WeakObservable",
+    "DispatchError",
+    "EventNotFound",
+    "HandlerNotFound",
+    "StopPropagation",
+]
@@ -0,0 +1,390 @@
+"""
+    Asynchronous event dispatching for asyncio applications.
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import random
+import time
+import typing as T
+import weakref
+from concurrent.futures import Future
+
+from .core import Observable, StopPropagation, _failed, _handler_name
+from .stats import DispatchHook
+
+
+__all__ = ["AsyncObservable"]
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_Semaphores = T.Dict[str, asyncio.Semaphore]
+
+
+def _running_loop() -> T.Optional[asyncio.AbstractEventLoop]:
+    """Returns the event loop running in the current thread, if any."""
+
+    # asyncio.get_running_loop raises instead and only exists from 3.7 on
+    return asyncio._get_running_loop()  # pylint: disable=protected-access
+
+
+class AsyncObservable(Observable):
+    """
+    An Observable whose trigger is a coroutine, which awaits the results
+    of coroutine handlers. Handlers are registered and unregistered just
+    like with Observable, including once and off.
+
+    The mode decides how coroutine handlers are run:
+
+    * ``"gather"`` runs them concurrently and waits for all of them
+    * ``"sequential"`` awaits them one after another in order
+    * ``"background"`` schedules them as tasks without waiting for them
+
+    Plain handlers are always called right away. When concurrency is set,
+    at most that many coroutine handlers run at the same time per event.
+    In background mode trigger waits for a free slot before scheduling a
+    task, so a burst of triggers can't spawn an unbounded number of tasks.
+    Further keyword arguments, like errors and executor, are passed to
+    Observable.
+
+    Instrumentation and hooks time handler calls including awaiting the
+    coroutines they return. batch isn't supported, since the recorded
+    triggers would have to be awaited when the batch ends. Neither are
+    trigger_many, results, reduce, submit and dispatcher, which call
+    the handlers synchronously and would drop the coroutines they
+    return without awaiting them; they raise a TypeError as well.
+
+    Events triggered by synchronous code, i.e. by ObservableProperty or
+    by the "event" error policy for calls delivered by flush, can't be
+    awaited. They are triggered in background tasks of the running
+    event loop instead, which drain waits for. Without a running loop
+    ObservableProperty raises a RuntimeError and flush logs failures.
+    """
+
+    __slots__ = ("mode", "concurrency", "_semaphores", "_tasks")
+
+    MODES = ("gather", "sequential", "background")
+
+    def __init__(
+            self, mode: str = "gather", concurrency: int = None, **kwargs: T.Any
+    ) -> None:
+        if mode not in self.MODES:
+            raise ValueError(
+                "mode must be one of {}, not {!r}".format(", ".join(self.MODES), mode)
+            )
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.concurrency = concurrency
+        #: semaphores of the events per event loop, as they are bound to one
+        self._semaphores = weakref.WeakKeyDictionary(
+        )  # type: T.MutableMapping[asyncio.AbstractEventLoop, _Semaphores]
+        self._tasks = set()  # type: T.Set[asyncio.Future]
+
+    def _semaphore(self, event: str) -> T.Optional[asyncio.Semaphore]:
+        """Returns the semaphore limiting the concurrency of an event or
+        None when concurrency isn't limited."""
+
+        if self.concurrency is None:
+            return None
+        loop = asyncio.get_event_loop()
+        semaphores = self._semaphores.get(loop)
+        if semaphores is None:
+            semaphores = self._semaphores[loop] = {}
+        semaphore = semaphores.get(event)
+        if semaphore is None:
+            semaphore = semaphores[event] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    @staticmethod
+    async def _bounded(semaphore: asyncio.Semaphore, awaitable: T.Awaitable) -> T.Any:
+        """Awaits the given awaitable while holding the semaphore."""
+
+        async with semaphore:
+            return await awaitable
+
+    def _schedule(
+            self, awaitable: T.Awaitable, semaphore: asyncio.Semaphore = None
+    ) -> asyncio.Future:
+        """Runs an awaitable as background task, which releases the
+        (already acquired) semaphore when it's done."""
+
+        task = asyncio.ensure_future(awaitable)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if semaphore is not None:
+            task.add_done_callback(lambda _: semaphore.release())
+        return task
+
+    async def trigger(  # type: ignore
+            self, event: str, *args: T.Any, **kw: T.Any
+    ) -> bool:
+        """Triggers all handlers which are subscribed to an event and
+        awaits or schedules the coroutines they return, depending on
+        the mode. A handler (or in sequential mode a coroutine) raising
+        StopPropagation skips the handlers which weren't called yet.
+        Exceptions of handlers and their coroutines are handled according
+        to errors, awaiting the handlers of the error event. In
+        background mode that happens once a task is done and "raise" and
+        "collect" log the failures, as there's nobody to raise them to.
+        Returns True when there were callbacks to execute, False
+        otherwise."""
+
+        handlers = self._snapshot(event)
+        if not handlers:
+            return False
+
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.record_trigger(event)
+        hooks = tuple(
+            hook for hook, rate in self._global_hooks + self._hooks
+            if random.random() < rate
+        )
+        call = functools.partial(self._call, event, hooks)
+        semaphore = self._semaphore(event)
+        raising = self.errors == "raise"
+        failures = []  # type: T.List[T.Tuple[T.Callable, Exception]]
+        if self.mode == "sequential":
+            for handler in handlers:
+                try:
+                    result = call(handler, args, kw)
+                    if inspect.isawaitable(result):
+                        if semaphore is None:
+                            await result
+                        else:
+                            await self._bounded(semaphore, result)
+                except StopPropagation:
+                    break
+                except Exception as exc:  # pylint: disable=broad-except
+                    if raising:
+                        raise
+                    failures.append((handler, exc))
+            if failures:
+                await self._handle_failures(event, failures, args, kw)
+            return True
+
+        awaitables = []
+        for handler in handlers:
+            try:
+                result = call(handler, args, kw)
+            except StopPropagation:
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                if raising:
+                    raise
+                failures.append((handler, exc))
+                continue
+            if inspect.isawaitable(result):
+                awaitables.append((handler, result))
+
+        if self.mode == "gather":
+            coroutines = [
+                awaitable if semaphore is None else self._bounded(semaphore, awaitable)
+                for _, awaitable in awaitables
+            ]
+            try:
+                results = await asyncio.gather(
+                    *coroutines, return_exceptions=not raising)
+            except StopPropagation:
+                results = []
+            for (handler, _), result in zip(awaitables, results):
+                if (isinstance(result, Exception)
+                        and not isinstance(result, StopPropagation)):
+                    failures.append((handler, result))
+        else:
+            for handler, awaitable in awaitables:
+                if semaphore is not None:
+                    await semaphore.acquire()
+                task = self._schedule(awaitable, semaphore)
+                task.add_done_callback(functools.partial(
+                    self._task_done, event, handler, args, kw))
+        if failures:
+            await self._handle_failures(event, failures, args, kw)
+        return True
+
+    def _trigger_soon(self, event: str, *args: T.Any, **kw: T.Any) -> bool:
+        """Schedules trigger as background task of the running event loop.
+        Returns whether there were handlers. Raises a RuntimeError when no
+        event loop is running."""
+
+        if not self._snapshot(event):
+            return False
+        if _running_loop() is None:
+            raise RuntimeError(
+                "AsyncObservable can't trigger {} without a running event "
+                "loop".format(event)
+            )
+        task = self._schedule(self.trigger(event, *args, **kw))
+        task.add_done_callback(functools.partial(self._trigger_done, event))
+        return True
+
+    @staticmethod
+    def _trigger_done(event: str, task: asyncio.Future) -> None:
+        """Logs the exception of a trigger scheduled by _trigger_soon, as
+        there's nobody to raise it to."""
+
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error(
+                "Trigger of event %s failed", event, exc_info=task.exception())
+
+    def _handle_errors(
+            self, event: str, failures: T.List[T.Tuple[T.Callable, Exception]],
+            args: tuple, kw: dict
+    ) -> None:
+        """Handles failed handlers like Observable does, but logs them
+        instead of triggering the error event without a running event
+        loop."""
+
+        if self.errors == "event" and _running_loop() is None:
+            for handler, exc in failures:
+                _LOGGER.error(
+                    "Handler %r of event %s failed", _failed(handler), event,
+                    exc_info=exc)
+            return
+        super()._handle_errors(event, failures, args, kw)
+
+    def batch(  # type: ignore
+            self, coalesce: bool = True
+    ) -> T.ContextManager[None]:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support batch")
+
+    def trigger_many(
+            self, event: str, items: T.Iterable[T.Sequence[T.Any]], **kw: T.Any
+    ) -> bool:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support trigger_many")
+
+    def results(self, event: str, *args: T.Any, **kw: T.Any) -> T.Iterator[T.Any]:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support results")
+
+    def reduce(
+            self, event: str, function: T.Callable[[T.Any, T.Any], T.Any],
+            initial: T.Any, *args: T.Any, **kw: T.Any
+    ) -> T.Any:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support reduce")
+
+    def submit(self, event: str, *args: T.Any, **kw: T.Any) -> T.List[Future]:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support submit")
+
+    def dispatcher(self, event: str) -> T.Callable:
+        """Not supported by AsyncObservable, raises a TypeError."""
+
+        raise TypeError("AsyncObservable doesn't support dispatcher")
+
+    def _call(
+            self, event: str, hooks: T.Tuple[DispatchHook, ...],
+            handler: T.Callable, args: tuple, kw: dict
+    ) -> T.Any:
+        """Calls a handler of an event. With instrumentation or hooks the
+        call is recorded, once the coroutine it returns is done, if any."""
+
+        if self.instrumentation is None and not hooks:
+            return handler(*args, **kw)
+        for hook in hooks:
+            hook.before(event, handler, args, kw)
+        start = self._clock_of_calls()
+        try:
+            result = handler(*args, **kw)
+        except BaseException as exc:
+            self._record(event, hooks, handler, args, kw, start, exc)
+            raise
+        if inspect.isawaitable(result):
+            return self._recorded(event, hooks, handler, args, kw, start, result)
+        self._record(event, hooks, handler, args, kw, start)
+        return result
+
+    async def _recorded(
+            self, event: str, hooks: T.Tuple[DispatchHook, ...],
+            handler: T.Callable, args: tuple, kw: dict, start: float,
+            awaitable: T.Awaitable
+    ) -> T.Any:
+        """Awaits the awaitable returned by a handler and records the
+        call when it's done."""
+
+        try:
+            result = await awaitable
+        except BaseException as exc:
+            self._record(event, hooks, handler, args, kw, start, exc)
+            raise
+        self._record(event, hooks, handler, args, kw, start)
+        return result
+
+    def _clock_of_calls(self) -> float:
+        """Returns the time of the clock of the instrumentation, if any,
+        to time handler calls with."""
+
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return time.perf_counter()
+        return instrumentation.clock()
+
+    def _record(
+            self, event: str, hooks: T.Tuple[DispatchHook, ...],
+            handler: T.Callable, args: tuple, kw: dict, start: float,
+            exception: BaseException = None
+    ) -> None:
+        """Records a call of a handler which started at start with the
+        instrumentation and hooks."""
+
+        seconds = self._clock_of_calls() - start
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.record_call(
+                event, _handler_name(handler), seconds,
+                exception is not None and not isinstance(exception, StopPropagation))
+        for hook in hooks:
+            hook.after(event, handler, args, kw, seconds, exception)
+
+    def _task_done(
+            self, event: str, handler: T.Callable, args: tuple, kw: dict,
+            task: asyncio.Future
+    ) -> None:
+        """Handles the exception of a background task of a handler."""
+
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if not isinstance(exc, Exception) or isinstance(exc, StopPropagation):
+            return
+        if self.errors in ("raise", "collect"):
+            _LOGGER.error(
+                "Handler %r of event %s failed", handler, event, exc_info=exc)
+        else:
+            self._schedule(self._handle_failures(event, [(handler, exc)], args, kw))
+
+    async def _handle_failures(
+            self, event: str, failures: T.List[T.Tuple[T.Callable, Exception]],
+            args: tuple, kw: dict
+    ) -> None:
+        """Handles the failed handlers of a trigger according to the
+        error policy, like _handle_errors, but awaits the handlers of
+        the error event."""
+
+        if self.errors != "event" or event == self.ERROR_EVENT:
+            self._handle_errors(event, failures, args, kw)
+            return
+        for handler, exc in failures:
+            if not await self.trigger(self.ERROR_EVENT, event, handler, exc):
+                _LOGGER.error(
+                    "Handler %r of event %s failed", handler, event, exc_info=exc)
+
+    async def drain(self) -> None:
+        """Waits until all handlers scheduled in background mode are
+        done."""
+
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
@@ -2,9 +2,28 @@
     Event system for python
 """
 
+import bisect
+import contextlib
+import copy
+import functools
+import inspect
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
 import typing as T
+import weakref
 
-from collections import defaultdict
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+
+from .patterns import PatternIndex, is_pattern
+from .stats import DispatchHook, Instrumentation
+
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class HandlerNotFound(Exception):
@@ -30,47 +49,1778 @@ class EventNotFound(Exception):
         return "Event {} wasn't found".format(self.event)
 
 
-class Observable:
-    """Event system for python"""
+class DispatchError(Exception):
+    """Raised by trigger when handlers of an event failed and errors are
+    collected. failures holds (handler, exception) pairs of all failed
+    handlers in the order they were called, call the arguments of the
+    trigger as (args, kw) tuple."""
+
+    def __init__(
+            self, event: str, failures: T.List[T.Tuple[T.Callable, Exception]],
+            call: T.Tuple[tuple, dict]
+    ) -> None:
+        super().__init__(event, failures)
+        self.event = event
+        self.failures = failures
+        self.call = call
+
+    @property
+    def exceptions(self) -> T.List[Exception]:
+        """The exceptions raised by the failed handlers."""
+
+        return [exc for _, exc in self.failures]
+
+    def retry(self) -> None:
+        """Calls the failed handlers again with the same arguments.
+        Raises a new DispatchError when any of them fails again."""
+
+        args, kw = self.call
+        failures = []
+        for handler, _ in self.failures:
+            try:
+                handler(*args, **kw)
+            except StopPropagation:
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                failures.append((handler, exc))
+        if failures:
+            raise DispatchError(self.event, failures, self.call)
+
+    def __str__(self) -> str:
+        return "{} handler(s) of event {} failed: {}".format(
+            len(self.failures), self.event,
+            "; ".join(repr(exc) for exc in self.exceptions)
+        )
+
+
+class StopPropagation(Exception):
+    """Raised by a handler to skip the remaining handlers of an event.
+    Every way of dispatching an event stops calling handlers, except
+    for handlers already submitted to an executor or scheduled as
+    tasks; results, reduce and submit use value as the result of the
+    handler raising it."""
+
+    def __init__(self, value: T.Any = None) -> None:
+        super().__init__(value)
+        self.value = value
+
+
+#: number of resolved event names cached while wildcard patterns are used
+_RESOLVED_EVENTS_LIMIT = 4096
+
+
+def _noop(*args: T.Any, **kw: T.Any) -> None:
+    """Dispatcher for events without any handlers"""
+
+
+def _compile_dispatcher(handlers: T.Tuple[T.Callable, ...]) -> T.Callable:
+    """Returns a callable which calls all the given handlers in order
+    and ends quietly when one of them raises StopPropagation.
+    A single handler is returned as is, so its StopPropagation reaches
+    the caller, and small numbers of handlers are called from an
+    unrolled function body instead of a loop."""
+
+    count = len(handlers)
+    if count == 0:
+        return _noop
+    if count == 1:
+        return handlers[0]
+    if count == 2:
+        first, second = handlers
+
+        def _dispatch_2(*args: T.Any, **kw: T.Any) -> None:
+            try:
+                first(*args, **kw)
+                second(*args, **kw)
+            except StopPropagation:
+                pass
+
+        return _dispatch_2
+    if count == 3:
+        first, second, third = handlers
+
+        def _dispatch_3(*args: T.Any, **kw: T.Any) -> None:
+            try:
+                first(*args, **kw)
+                second(*args, **kw)
+                third(*args, **kw)
+            except StopPropagation:
+                pass
+
+        return _dispatch_3
+
+    def _dispatch_n(*args: T.Any, **kw: T.Any) -> None:
+        try:
+            for handler in handlers:
+                handler(*args, **kw)
+        except StopPropagation:
+            pass
+
+    return _dispatch_n
+
+
+def _compile_isolated_dispatcher(
+        handlers: T.Tuple[T.Callable, ...],
+        handle_errors: T.Callable[[T.List[T.Tuple[T.Callable, Exception]],
+                                   tuple, dict], None]
+) -> T.Callable:
+    """Returns a callable which calls all the given handlers in order,
+    even when some of them raise, and passes the failures of a call to
+    handle_errors afterwards."""
+
+    def _dispatch_isolated(*args: T.Any, **kw: T.Any) -> None:
+        failures = []
+        for handler in handlers:
+            try:
+                handler(*args, **kw)
+            except StopPropagation:
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                failures.append((handler, exc))
+        if failures:
+            handle_errors(failures, args, kw)
+
+    return _dispatch_isolated
+
+
+def _handler_name(handler: T.Callable) -> str:
+    """Returns the qualified name of a handler, looking through the
+    wrappers and partial applications it may be registered with."""
+
+    while True:
+        if isinstance(handler, functools.partial):
+            handler = handler.func
+        elif isinstance(handler, _WeaklyBound):
+            handler = handler.function
+        elif isinstance(handler, (_HandlerWrapper, _OnceHandler)):
+            handler = handler.handler
+        elif isinstance(handler, _WeakHandler):
+            referent = handler._ref()  # pylint: disable=protected-access
+            if referent is None:
+                return repr(handler)
+            handler = referent
+        else:
+            break
+    if inspect.ismethod(handler):
+        handler = handler.__func__
+    name = getattr(handler, "__qualname__", None)
+    if name is None:
+        name = type(handler).__qualname__
+    module = getattr(handler, "__module__", None)
+    return name if module is None else "{}.{}".format(module, name)
+
+
+def _counted(
+        dispatch: T.Callable, event: str, instrumentation: Instrumentation
+) -> T.Callable:
+    """Returns a dispatcher which records the trigger of an event with
+    the instrumentation before calling dispatch."""
+
+    record = instrumentation.record_trigger
+
+    def _dispatch_counted(*args: T.Any, **kw: T.Any) -> None:
+        record(event)
+        dispatch(*args, **kw)
+
+    return _dispatch_counted
+
+
+def _compile_hooked_dispatcher(
+        dispatch: T.Callable, handlers: T.Tuple[T.Callable, ...], event: str,
+        hooks: T.Tuple[T.Tuple[DispatchHook, float], ...],
+        compile_dispatcher: T.Callable[[T.Tuple[T.Callable, ...]], T.Callable]
+) -> T.Callable:
+    """Returns a dispatcher which samples each of the (hook, rate) pairs
+    with its rate on every call. Unless a hook was sampled, dispatch is
+    called. Otherwise the handlers are called through a dispatcher
+    compiled by compile_dispatcher, which calls the sampled hooks
+    around every handler. Those dispatchers are cached by the hooks."""
+
+    traced = {}  # type: T.Dict[T.Tuple[DispatchHook, ...], T.Callable]
+    sample = random.random
+
+    if len(hooks) == 1:
+        (hook, rate), = hooks
+        traced_dispatch = compile_dispatcher(tuple(
+            _HookedHandler(h, event, (hook,)) for h in handlers
+        ))
+
+        def _dispatch_hooked_1(*args: T.Any, **kw: T.Any) -> None:
+            if sample() < rate:
+                traced_dispatch(*args, **kw)
+            else:
+                dispatch(*args, **kw)
+
+        return _dispatch_hooked_1
+
+    def _dispatch_hooked(*args: T.Any, **kw: T.Any) -> None:
+        active = ()  # type: T.Tuple[DispatchHook, ...]
+        for hook, rate in hooks:
+            if sample() < rate:
+                active += (hook,)
+        if not active:
+            dispatch(*args, **kw)
+            return
+        traced_dispatch = traced.get(active)
+        if traced_dispatch is None:
+            traced_dispatch = traced[active] = compile_dispatcher(tuple(
+                _HookedHandler(h, event, active) for h in handlers
+            ))
+        traced_dispatch(*args, **kw)
+
+    return _dispatch_hooked
+
+
+#: types of methods implemented in C, like lst.append and obj.__str__
+_BUILTIN_METHODS = (type([].append), type(object().__str__))
+
+
+def _builtin_self(handler: T.Callable) -> T.Any:
+    """Returns the object a method implemented in C is bound to, or None
+    for other handlers and functions of modules, like len."""
+
+    if not isinstance(handler, _BUILTIN_METHODS):
+        return None
+    obj = handler.__self__
+    return None if inspect.ismodule(obj) else obj
+
+
+def _identity(handler: T.Callable) -> T.Hashable:
+    """Returns a key identifying a handler by the objects it's made of
+    rather than by equality, so bound methods of the same object and
+    function get the same key."""
+
+    if inspect.ismethod(handler):
+        return id(handler.__self__), id(handler.__func__)
+    obj = _builtin_self(handler)
+    if obj is not None:
+        return id(obj), handler.__name__
+    return id(handler)
+
+
+class _WeakBuiltinMethod:
+    """Weak reference to a method implemented in C, like
+    weakref.WeakMethod for methods of Python functions. Those methods
+    are created on every attribute access, so the object is referenced
+    weakly instead and the method looked up again when dereferenced.
+    Raises TypeError when the object can't be referenced weakly."""
+
+    __slots__ = ("_obj", "_name")
+
+    def __init__(self, method: T.Callable) -> None:
+        self._obj = weakref.ref(method.__self__)
+        self._name = method.__name__
+
+    def __call__(self) -> T.Optional[T.Callable]:
+        obj = self._obj()
+        return None if obj is None else getattr(obj, self._name)
+
+
+class _WeakHandler:
+    """Calls a handler through a weak reference, so registering it
+    doesn't keep it (or the object of a bound method) alive.
+
+    When the handler was garbage collected, calling the wrapper calls
+    prune instead, which is expected to unregister the wrapper.
+    Wrappers are hashed like their handler and compare equal to it
+    (and to wrappers of it) by identity, even after it was collected."""
+
+    __slots__ = ("_ref", "_key", "_hash", "prune")
+
+    def __init__(
+            self, handler: T.Callable, prune: T.Callable[[], T.Any] = None
+    ) -> None:
+        if inspect.ismethod(handler):
+            self._ref = weakref.WeakMethod(handler)  # type: T.Callable
+        elif _builtin_self(handler) is not None:
+            self._ref = _WeakBuiltinMethod(handler)
+        else:
+            self._ref = weakref.ref(handler)
+        self._key = _identity(handler)
+        try:
+            self._hash = hash(handler)  # type: T.Optional[int]
+        except TypeError:
+            self._hash = None
+        self.prune = prune
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        handler = self._ref()
+        if handler is None:
+            if self.prune is not None:
+                self.prune()
+            return None
+        return handler(*args, **kw)
+
+    def __eq__(self, other: T.Any) -> bool:
+        if isinstance(other, _WeakHandler):
+            return self._key == other._key
+        return callable(other) and self._key == _identity(other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            raise TypeError("unhashable handler: {!r}".format(self._ref()))
+        return self._hash
+
+    def __repr__(self) -> str:
+        return "<weak handler {!r}>".format(self._ref())
+
+
+class _HandlerWrapper:
+    """Base class for wrappers changing how a handler is called.
+    Wrappers are hashed like their handler and compare equal to it."""
+
+    __slots__ = ("handler",)
+
+    def __init__(self, handler: T.Callable) -> None:
+        self.handler = handler
+
+    def __eq__(self, other: T.Any) -> bool:
+        if isinstance(other, _HandlerWrapper):
+            other = other.handler
+        return bool(self.handler == other)
+
+    def __hash__(self) -> int:
+        return hash(self.handler)
+
+    def __repr__(self) -> str:
+        return "<{} {!r}>".format(type(self).__name__, self.handler)
+
+
+class _ExecutorHandler(_HandlerWrapper):
+    """Submits a handler to an executor instead of calling it, and
+    returns the resulting future."""
+
+    __slots__ = ("executor",)
+
+    def __init__(self, handler: T.Callable, executor: Executor) -> None:
+        super().__init__(handler)
+        self.executor = executor
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> Future:
+        return self.executor.submit(self.handler, *args, **kw)
+
+
+class _BatchHandler(_HandlerWrapper):
+    """Calls a handler expecting a sequence of argument tuples.
+    Single triggers are passed as sequence with one item."""
+
+    __slots__ = ()
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        return self.handler([args], **kw)
+
+
+async def _await_all(awaitables: T.List[T.Awaitable]) -> None:
+    """Awaits the given awaitables one after another."""
+
+    for awaitable in awaitables:
+        await awaitable
+
+
+class _Handlers:
+    """Calls several handlers in order. Awaitables returned by them are
+    awaited one after another by the coroutine returned instead of None,
+    so AsyncObservable still awaits coroutine handlers."""
+
+    __slots__ = ("handlers",)
+
+    def __init__(self, handlers: T.Tuple[T.Callable, ...]) -> None:
+        self.handlers = handlers
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        awaitables = []
+        for handler in self.handlers:
+            result = handler(*args, **kw)
+            if inspect.isawaitable(result):
+                awaitables.append(result)
+        return _await_all(awaitables) if awaitables else None
+
+    def __repr__(self) -> str:
+        return "<{} {!r}>".format(type(self).__name__, self.handlers)
+
+
+class _OnceHandler:
+    """Unregisters itself from the event of an Observable before calling
+    a handler, unless it was already unregistered by a previous call.
+    Unlike _HandlerWrapper it's only equal to itself, so off and
+    is_registered need the wrapper returned by once."""
+
+    __slots__ = ("handler", "observable", "event")
+
+    def __init__(
+            self, handler: T.Callable, observable: "Observable", event: str
+    ) -> None:
+        self.handler = handler
+        self.observable = observable
+        self.event = event
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        try:
+            self.observable.off(self.event, self)
+        except (EventNotFound, HandlerNotFound):
+            return None
+        return self.handler(*args, **kw)
+
+    def __repr__(self) -> str:
+        return "<{} {!r}>".format(type(self).__name__, self.handler)
+
+
+class _WeaklyBound:
+    """Calls a function with an Observable and args as first arguments,
+    like functools.partial, but references the Observable weakly, so it
+    can be cached on the Observable without keeping it alive. Calls
+    after the Observable was garbage collected do nothing."""
+
+    __slots__ = ("function", "ref", "args")
+
+    def __init__(
+            self, function: T.Callable, observable: "Observable", *args: T.Any
+    ) -> None:
+        self.function = function
+        self.ref = weakref.ref(observable)
+        self.args = args
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        observable = self.ref()
+        if observable is None:
+            return None
+        return self.function(observable, *self.args, *args, **kw)
+
+    def __repr__(self) -> str:
+        return "<{} {!r}>".format(type(self).__name__, self.function)
+
+
+def _failed(handler: T.Callable) -> T.Callable:
+    """Returns the handler to report for a failed handler of a snapshot,
+    looking through the wrappers which only trace calls and the once
+    wrapper, which unregistered itself already and wouldn't call the
+    handler again on retry."""
+
+    while isinstance(handler, (_InstrumentedHandler, _HookedHandler, _OnceHandler)):
+        handler = handler.handler
+    return handler
+
+
+class _DeferredHandler(_HandlerWrapper):
+    """Base class for wrappers which may defer calls of a handler.
+    Only the arguments of the latest deferred call are kept. defer is
+    called to schedule the delivery of that call at self.due."""
+
+    __slots__ = ("interval", "clock", "defer", "call", "due", "timer")
+
+    def __init__(
+            self, handler: T.Callable, interval: float,
+            clock: T.Callable[[], float],
+            defer: T.Callable[["_DeferredHandler"], None]
+    ) -> None:
+        super().__init__(handler)
+        self.interval = interval
+        self.clock = clock
+        self.defer = defer
+        self.call = None  # type: T.Optional[T.Tuple[tuple, dict]]
+        self.due = 0.0
+        self.timer = None  # type: T.Any
+
+    def deliver(self) -> None:
+        """Calls the handler with the arguments of the deferred call."""
+
+        call, self.call, self.timer = self.call, None, None
+        if call is not None:
+            try:
+                self.handler(*call[0], **call[1])
+            except StopPropagation:
+                pass
+
+
+class _DebouncedHandler(_DeferredHandler):
+    """Calls the handler with the latest arguments once no more calls
+    happened for interval seconds."""
+
+    __slots__ = ()
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> None:
+        self.call = (args, kw)
+        self.due = self.clock() + self.interval
+        self.defer(self)
+
+
+class _ThrottledHandler(_DeferredHandler):
+    """Calls the handler at most once every interval seconds. Calls in
+    between are deferred and only the latest of them is delivered at
+    the end of the interval."""
+
+    __slots__ = ("last",)
+
+    def __init__(self, *args: T.Any, **kw: T.Any) -> None:
+        super().__init__(*args, **kw)
+        self.last = None  # type: T.Optional[float]
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        now = self.clock()
+        last = self.last
+        if self.call is None and (last is None or now - last >= self.interval):
+            self.last = now
+            return self.handler(*args, **kw)
+        self.call = (args, kw)
+        if self.timer is None:
+            self.due = (now if last is None else last) + self.interval
+            self.defer(self)
+        return None
+
+    def deliver(self) -> None:
+        if self.call is not None:
+            self.last = self.clock()
+        super().deliver()
+
+
+class _CoalescedHandler(_DeferredHandler):
+    """Defers all calls until the next flush and then calls the handler
+    only with the latest arguments."""
+
+    __slots__ = ()
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> None:
+        self.call = (args, kw)
+        self.due = self.clock()
+        self.defer(self)
+
+
+class _InstrumentedHandler(_HandlerWrapper):
+    """Calls a handler and records the call with an Instrumentation."""
+
+    __slots__ = ("event", "name", "instrumentation")
+
+    def __init__(
+            self, handler: T.Callable, event: str, instrumentation: Instrumentation
+    ) -> None:
+        super().__init__(handler)
+        self.event = event
+        self.name = _handler_name(handler)
+        self.instrumentation = instrumentation
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        clock = self.instrumentation.clock
+        start = clock()
+        try:
+            result = self.handler(*args, **kw)
+        except StopPropagation:
+            failed = False
+            raise
+        except BaseException:
+            failed = True
+            raise
+        else:
+            failed = False
+            return result
+        finally:
+            self.instrumentation.record_call(
+                self.event, self.name, clock() - start, failed)
+
+
+class _HookedHandler(_HandlerWrapper):
+    """Calls a handler between the before and after calls of hooks."""
+
+    __slots__ = ("event", "hooks")
+
+    def __init__(
+            self, handler: T.Callable, event: str,
+            hooks: T.Tuple[DispatchHook, ...]
+    ) -> None:
+        super().__init__(handler)
+        self.event = event
+        self.hooks = hooks
+
+    def __call__(self, *args: T.Any, **kw: T.Any) -> T.Any:
+        for hook in self.hooks:
+            hook.before(self.event, self.handler, args, kw)
+        exception = None  # type: T.Optional[BaseException]
+        start = time.perf_counter()
+        try:
+            return self.handler(*args, **kw)
+        except BaseException as exc:
+            exception = exc
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            for hook in self.hooks:
+                hook.after(self.event, self.handler, args, kw, seconds, exception)
+
+
+def _with_event(handler: T.Callable, event: str) -> T.Callable:
+    """Returns a callable passing the event name as first argument to a
+    handler registered for a wildcard pattern. Batch and executor
+    wrappers stay the outermost wrappers, so they are still recognized."""
+
+    if isinstance(handler, _BatchHandler):
+        return _BatchHandler(_with_event(handler.handler, event))
+    if isinstance(handler, _ExecutorHandler):
+        return _ExecutorHandler(
+            _with_event(handler.handler, event), handler.executor)
+    return functools.partial(handler, event)
+
+
+def _on_executor(handler: T.Callable, executor: Executor) -> T.Callable:
+    """Returns a wrapper of handler submitting it to the executor, unless
+    it is submitted to an executor already. Batch handlers stay the
+    outermost wrapper, so trigger_many still submits a whole batch."""
+
+    if isinstance(handler, _ExecutorHandler):
+        return handler
+    if isinstance(handler, _BatchHandler):
+        return _BatchHandler(_on_executor(handler.handler, executor))
+    return _ExecutorHandler(handler, executor)
+
+
+class _NoLock:
+    """Context manager used instead of a lock by Observables which
+    aren't thread-safe."""
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: T.Any) -> None:
+        pass
+
+
+class _EmptyDict(dict):
+    """Always empty dict shared by Observables without handlers, so they
+    don't have to allocate their registry and caches until the first
+    call of on. Writing to it is a bug and raises TypeError. Copies and
+    unpickled instances are _EMPTY itself, as it's compared by identity."""
+
+    __slots__ = ()
+
+    def __reduce__(self) -> str:
+        return "_EMPTY"
+
+    def __setitem__(self, key: T.Any, value: T.Any) -> None:
+        raise TypeError("The shared empty dict can't be changed")
+
+    def setdefault(self, key: T.Any, default: T.Any = None) -> T.Any:
+        raise TypeError("The shared empty dict can't be changed")
+
+
+#: registry and caches of Observables without handlers
+_EMPTY = _EmptyDict()  # type: T.Dict[T.Any, T.Any]
+
+#: lock serializing changes to class-level handlers and global hooks
+_CLASS_LOCK = threading.Lock()
+
+
+def _by_priority(
+        entries: T.List[T.Tuple[int, T.Callable]]
+) -> T.List[T.Tuple[int, T.Callable]]:
+    """Sorts (priority, handler) pairs by descending priority. The sort
+    is stable, so handlers with equal priorities keep their order."""
+
+    if any(priority for priority, _ in entries):
+        entries.sort(key=lambda entry: -entry[0])
+    return entries
+
+
+class _ClassDispatcher:
+    """Dispatcher of an event with only class-level handlers, which is
+    called with the Observable as first argument by trigger. Caching it
+    instead of a dispatcher bound to the Observable keeps the Observable
+    from referencing itself."""
+
+    __slots__ = ("dispatch",)
+
+    def __init__(self, dispatch: T.Callable) -> None:
+        self.dispatch = dispatch
+
+
+#: class-level handlers of an event ordered by priority, their compiled
+#: dispatcher and the priority of every handler
+_ClassEntry = T.NamedTuple("_ClassEntry", [
+    ("handlers", T.Tuple[T.Callable, ...]),
+    ("dispatcher", _ClassDispatcher),
+    ("priorities", T.Tuple[int, ...]),
+])
+
+#: class-level handlers by event
+_ClassHandlers = T.Dict[str, _ClassEntry]
+
+
+def _merge_class_handlers(cls: type) -> _ClassHandlers:
+    """Returns the class-level handlers of a class and its bases, base
+    classes first and ordered by priority, along with a compiled
+    dispatcher and the priorities of the handlers for every event."""
+
+    entries = {}  # type: T.Dict[str, T.List[T.Tuple[int, T.Callable]]]
+    for klass in reversed(cls.__mro__):
+        for event, registry in vars(klass).get("_class_events", {}).items():
+            entries.setdefault(event, []).extend(registry.prioritized())
+    merged = {}  # type: _ClassHandlers
+    for event, pairs in entries.items():
+        if pairs:
+            priorities, handlers = zip(*_by_priority(pairs))
+            merged[event] = _ClassEntry(
+                handlers, _ClassDispatcher(_compile_dispatcher(handlers)),
+                priorities)
+    return merged or _EMPTY
+
+
+def _subclasses(cls: T.Type["Observable"]) -> T.Iterator[T.Type["Observable"]]:
+    """Yields a class and all of its subclasses."""
+
+    yield cls
+    for subclass in cls.__subclasses__():
+        yield from _subclasses(subclass)
+
+
+class _BatchedSet:
+    """Coalesced sets of an ObservableProperty of holder during a batch:
+    args are the arguments of the first set with the value of the latest
+    one. With unchanged (a function comparing the old and the new
+    value), the second argument is the old value, and the events aren't
+    triggered at all when the property got its old value back."""
+
+    __slots__ = ("holder", "events", "args", "unchanged")
+
+    def __init__(
+            self, holder: T.Any, events: T.Tuple[T.Optional[str], ...],
+            args: tuple, unchanged: T.Optional[T.Callable[[T.Any, T.Any], bool]]
+    ) -> None:
+        # keeps the holder alive, so its id isn't reused during the batch
+        self.holder = holder
+        self.events = events
+        self.args = args
+        self.unchanged = unchanged
+
+    def triggers(self) -> T.List[T.Tuple[str, tuple, dict]]:
+        """Returns the triggers of the coalesced sets."""
+
+        if self.unchanged is not None and self.unchanged(self.args[1], self.args[0]):
+            return []
+        return [(event, self.args, {}) for event in self.events if event is not None]
+
+
+class _Batch:
+    """Triggers recorded by a thread during a batch, in order."""
+
+    __slots__ = ("coalesce", "triggers", "sets")
+
+    def __init__(self, coalesce: bool) -> None:
+        self.coalesce = coalesce
+        self.triggers = []  # type: T.List[T.Any]
+        #: coalesced sets by the id of the holder and the events
+        self.sets = {}  # type: T.Dict[T.Tuple[int, tuple], _BatchedSet]
+
+    def record(self, event: str, *args: T.Any, **kw: T.Any) -> None:
+        """Records a trigger of an event."""
+
+        self.triggers.append((event, args, kw))
+
+    def record_set(
+            self, holder: T.Any, events: T.Tuple[T.Optional[str], ...],
+            args: tuple, unchanged: T.Callable[[T.Any, T.Any], bool] = None
+    ) -> None:
+        """Records the before and after events of setting an
+        ObservableProperty of holder, coalesced with previous sets of the
+        same property of the same holder (see _BatchedSet)."""
+
+        key = (id(holder), events)
+        recorded = self.sets.get(key)
+        if recorded is None:
+            recorded = self.sets[key] = _BatchedSet(holder, events, args, unchanged)
+            self.triggers.append(recorded)
+        else:
+            recorded.args = args[:1] + recorded.args[1:]
+
+    def pending(self) -> T.Iterator[T.Tuple[str, tuple, dict]]:
+        """Yields the recorded triggers in order."""
+
+        for trigger in self.triggers:
+            if isinstance(trigger, _BatchedSet):
+                yield from trigger.triggers()
+            else:
+                yield trigger
+
+
+class _BatchDispatchers(dict):
+    """Stands in for the dispatcher cache of an Observable while threads
+    batch it: events triggered by a batching thread resolve to a
+    dispatcher recording the trigger in the batch of the thread, while
+    other threads get dispatchers compiled (and cached in the stand-in)
+    as usual. That way trigger itself needs no extra check outside of
+    batches. dispatchers is the cache to restore after the batches."""
+
+    def __init__(self, dispatchers: T.Dict[str, T.Callable]) -> None:
+        super().__init__()
+        self.dispatchers = dispatchers
+        self.batches = {}  # type: T.Dict[int, _Batch]
+
+    def get(self, event: str, default: T.Any = None) -> T.Any:
+        batch = self.batches.get(threading.get_ident())
+        if batch is None:
+            return super().get(event, default)
+        return functools.partial(batch.record, event)
+
+
+#: ids of handler registrations, shared by all registries
+_REGISTRATIONS = itertools.count()
+
+#: insertion ordered dict, which dicts are from Python 3.7 on
+_OrderedDict = dict if sys.version_info >= (3, 7) else OrderedDict
+
+
+def _key(handler: T.Callable) -> T.Hashable:
+    """Returns the key of a handler in the index of a registry, which is
+    the handler itself unless it isn't hashable, like objects defining
+    __eq__ but not __hash__. Those (and their wrappers) are keyed by
+    identity instead, so they are only found by themselves."""
+
+    try:
+        hash(handler)
+    except TypeError:
+        while isinstance(handler, _HandlerWrapper):
+            handler = handler.handler
+        if isinstance(handler, _WeakHandler):
+            return handler._key
+        return _identity(handler)
+    return handler
+
+
+def _finds(registered: T.Callable, handler: T.Callable) -> bool:
+    """Returns whether looking up handler finds a registered handler, like
+    a lookup in the index of a registry would."""
+
+    found, key = _key(registered), _key(handler)
+    return found is key or (hash(found) == hash(key) and bool(found == key))
+
+
+#: registrations grouped by priority, the sorted distinct priorities and
+#: the registrations by key of the handler
+_Buckets = T.Tuple[
+    T.Dict[int, T.Dict[int, T.Callable]], T.List[int],
+    T.Dict[T.Hashable, T.List[T.Tuple[int, int]]]
+]
+
+
+class _EventHandlers:
+    """Ordered registry of the handlers of a single event.
+
+    Every registration gets a unique id, so the same handler may be
+    registered multiple times. Registrations are grouped by priority in
+    insertion ordered dicts, which are iterated by descending priority
+    along a sorted list of the distinct priorities. Registrations are
+    also indexed by handler (see _key), which makes membership tests and
+    removing a registration O(1) and removing all k registrations of a
+    handler O(k). Only adding the first registration of a priority costs
+    O(p) for p distinct priorities.
+
+    Most events only ever get a single registration, which is kept as
+    one (id, priority, handler) tuple until a second one is added."""
+
+    __slots__ = ("_single", "_buckets")
 
     def __init__(self) -> None:
-        self._events = defaultdict(list)  # type: T.DefaultDict[str, T.List[T.Callable]]
+        self._single = None  # type: T.Optional[T.Tuple[int, int, T.Callable]]
+        self._buckets = None  # type: T.Optional[_Buckets]
+
+    def __contains__(self, handler: T.Callable) -> bool:
+        if self._single is not None:
+            return _finds(self._single[2], handler)
+        return self._buckets is not None and _key(handler) in self._buckets[2]
+
+    def __iter__(self) -> T.Iterator[T.Callable]:
+        if self._single is not None:
+            yield self._single[2]
+        elif self._buckets is not None:
+            buckets, priorities, _ = self._buckets
+            for priority in reversed(priorities):
+                yield from buckets[priority].values()
+
+    def __bool__(self) -> bool:
+        return self._single is not None or bool(
+            self._buckets is not None and self._buckets[2])
+
+    def __len__(self) -> int:
+        if self._single is not None:
+            return 1
+        if self._buckets is None:
+            return 0
+        return sum(len(bucket) for bucket in self._buckets[0].values())
+
+    def prioritized(self) -> T.List[T.Tuple[int, T.Callable]]:
+        """Returns (priority, handler) pairs of all registrations in
+        order."""
+
+        if self._single is not None:
+            return [self._single[1:]]
+        if self._buckets is None:
+            return []
+        buckets, priorities, _ = self._buckets
+        return [
+            (priority, handler)
+            for priority in reversed(priorities)
+            for handler in buckets[priority].values()
+        ]
+
+    def copy(self) -> "_EventHandlers":
+        """Returns a registry with the same registrations."""
+
+        registry = _EventHandlers()
+        registry._single = self._single
+        if self._buckets is not None:
+            by_priority, priorities, index = self._buckets
+            registry._buckets = (
+                {
+                    priority: _OrderedDict(bucket)
+                    for priority, bucket in by_priority.items()
+                },
+                list(priorities),
+                {key: list(registrations) for key, registrations in index.items()},
+            )
+        return registry
+
+    def add(self, handler: T.Callable, priority: int = 0) -> int:
+        """Inserts a registration of the given handler after all
+        registrations with the same or a higher priority and returns
+        its registration id."""
+
+        registration = next(_REGISTRATIONS)
+        if self._buckets is None:
+            if self._single is None:
+                self._single = (registration, priority, handler)
+                return registration
+            self._buckets = ({}, [], {})
+            self._insert(self._buckets, *self._single)
+            self._single = None
+        self._insert(self._buckets, registration, priority, handler)
+        return registration
+
+    @staticmethod
+    def _insert(
+            buckets: _Buckets, registration: int, priority: int, handler: T.Callable
+    ) -> None:
+        """Adds a registration to the bucket of its priority and to the
+        index."""
+
+        by_priority, priorities, index = buckets
+        bucket = by_priority.get(priority)
+        if bucket is None:
+            bucket = by_priority[priority] = _OrderedDict()
+            bisect.insort(priorities, priority)
+        bucket[registration] = handler
+        index.setdefault(_key(handler), []).append((priority, registration))
+
+    @staticmethod
+    def _unbucket(buckets: _Buckets, priority: int, registration: int) -> T.Any:
+        """Removes a registration from the bucket of its priority and
+        returns its handler, or None when it doesn't exist."""
+
+        by_priority, priorities, _ = buckets
+        bucket = by_priority.get(priority)
+        if bucket is None:
+            return None
+        handler = bucket.pop(registration, None)
+        if not bucket:
+            del by_priority[priority]
+            del priorities[bisect.bisect_left(priorities, priority)]
+        return handler
+
+    def discard(self, registration: int, priority: int) -> None:
+        """Removes a single registration by its id and priority, if it
+        still exists."""
+
+        if self._single is not None:
+            if self._single[0] == registration:
+                self._single = None
+            return
+        if self._buckets is None:
+            return
+        handler = self._unbucket(self._buckets, priority, registration)
+        if handler is None:
+            return
+        index = self._buckets[2]
+        key = _key(handler)
+        registrations = index[key]
+        registrations.remove((priority, registration))
+        if not registrations:
+            del index[key]
+
+    def remove(self, handler: T.Callable) -> T.List[T.Callable]:
+        """Removes all registrations of the given handler and returns
+        the removed handlers, which are empty when it wasn't registered."""
+
+        if self._single is not None:
+            if not _finds(self._single[2], handler):
+                return []
+            removed = self._single[2]
+            self._single = None
+            return [removed]
+        if self._buckets is None:
+            return []
+        registrations = self._buckets[2].pop(_key(handler), None)
+        if registrations is None:
+            return []
+        return [
+            self._unbucket(self._buckets, priority, registration)
+            for priority, registration in registrations
+        ]
+
+
+class Observable:
+    """Event system for python
+
+    The handlers of every event are kept in an indexed registry.
+    trigger calls a dispatcher compiled from an immutable snapshot of
+    that registry. on, off and once only drop the dispatcher of the
+    events they change and it is compiled again lazily on the next
+    trigger. That way trigger never copies the handlers, handlers added
+    during dispatch still don't run until the next trigger and bursts
+    of registrations don't rebuild the snapshot every time. results,
+    submit and trigger_many take a snapshot on every call instead, so
+    only the dispatchers have to be cached.
+
+    Handlers registered with weak=True are only referenced weakly and
+    pruned by the first trigger after they were garbage collected.
+
+    Handlers registered with an executor, or all handlers when the
+    Observable has an executor, are submitted to that
+    concurrent.futures.Executor instead of being called by trigger.
+
+    Calls of handlers registered with debounce, throttle or coalesce
+    may be deferred. Deferred calls are delivered by flush, which
+    compares their due time with clock, or, when loop is set to an
+    asyncio event loop, scheduled on that loop.
+
+    Events containing "*" are wildcard patterns (see observable.patterns).
+    Their handlers are called for every matching event, after the
+    handlers of the event itself and with the name of the triggered event
+    as first argument. Which patterns match an event name is looked up
+    in a trie once and cached until patterns change.
+
+    Observables declare __slots__ and share one empty registry until
+    the first handler is registered, so models with many instances stay
+    small. Subclasses should declare __slots__ as well to keep it that
+    way. Instead of tracking all instances, changes of class-level
+    handlers and global hooks start a new generation, and instances
+    drop the dispatchers of an older one on their next trigger.
+
+    Handlers registered with on_class are stored once on the class and
+    called for the events of all its instances (and of instances of
+    subclasses), before the handlers registered on the instance and
+    with the instance as first argument.
+
+    errors is the policy for handlers raising an exception:
+
+    * ``"raise"`` lets the exception propagate from trigger and skips
+      the remaining handlers
+    * ``"collect"`` calls all handlers and raises a DispatchError with
+      all failures afterwards
+    * ``"log"`` calls all handlers and logs the failures
+    * ``"event"`` calls all handlers and triggers the "error" event
+      with the event, the handler and the exception for every failure.
+      Failures are logged when there are no handlers for "error" or
+      they fail themselves.
+
+    When instrumentation is set to an observable.stats.Instrumentation,
+    triggers and handler calls are recorded by the dispatchers. Hooks
+    added with add_hook or add_global_hook trace single handler calls
+    of a sample of the triggers. Without instrumentation and hooks
+    dispatching has no overhead."""
+
+    __slots__ = (
+        "_events", "_dispatchers", "_generation", "_executor", "_errors",
+        "_instrumentation", "_hooks", "_deferred", "_patterns", "_clock",
+        "_loop", "__weakref__",
+    )
+
+    ERROR_POLICIES = ("raise", "collect", "log", "event")
+
+    #: event triggered for failed handlers with the "event" error policy
+    ERROR_EVENT = "error"
+
+    #: default for the weak argument of on and once
+    weak_handlers = False
+
+    #: lock serializing changes to the handlers, see ThreadSafeObservable
+    _lock = _NoLock()  # type: T.ContextManager
+
+    #: (hook, sample rate) pairs of all Observables, see add_global_hook
+    _global_hooks = ()  # type: T.Tuple[T.Tuple[DispatchHook, float], ...]
+
+    #: handlers registered with on_class on the class and its bases
+    _class_handlers = _EMPTY  # type: _ClassHandlers
+
+    #: replaced whenever class-level handlers or global hooks change
+    _class_generation = object()  # type: object
+
+    def __init__(self, executor: Executor = None, errors: str = "raise") -> None:
+        self._check_errors(errors)
+        cls = type(self)
+        if cls._class_handlers and "_class_handlers" not in vars(cls):
+            cls._own_class_handlers()
+        self._events = _EMPTY  # type: T.Dict[str, _EventHandlers]
+        self._dispatchers = _EMPTY  # type: T.Dict[str, T.Optional[T.Callable]]
+        self._generation = self._class_generation  # type: object
+        self._executor = executor
+        self._errors = errors
+        self._instrumentation = None  # type: T.Optional[Instrumentation]
+        self._hooks = ()  # type: T.Tuple[T.Tuple[DispatchHook, float], ...]
+        self._deferred = _EMPTY  # type: T.Dict[int, T.Tuple[str, _DeferredHandler]]
+        self._patterns = None  # type: T.Optional[PatternIndex]
+        self._clock = time.monotonic  # type: T.Callable[[], float]
+        self._loop = None  # type: T.Any
+
+    def __getstate__(self) -> T.Tuple[T.Optional[dict], T.Dict[str, T.Any]]:
+        """Returns the state copied and pickled, without the caches: the
+        compiled dispatchers are closures, which can't be pickled and
+        would keep calling the handlers of the original. The registry is
+        copied, so registering handlers on a copy doesn't change the
+        original."""
+
+        slots = {}  # type: T.Dict[str, T.Any]
+        for klass in type(self).__mro__:
+            names = vars(klass).get("__slots__", ())
+            for name in (names,) if isinstance(names, str) else names:
+                if name not in ("__dict__", "__weakref__") and hasattr(self, name):
+                    slots.setdefault(name, getattr(self, name))
+        slots["_dispatchers"] = _EMPTY
+        if self._events is not _EMPTY:
+            slots["_events"] = {
+                event: registry.copy() for event, registry in self._events.items()
+            }
+            slots["_patterns"] = copy.deepcopy(self._patterns)
+        return getattr(self, "__dict__", None), slots
+
+    @property
+    def clock(self) -> T.Callable[[], float]:
+        """The clock used to time deferred handler calls."""
+
+        return self._clock
+
+    @clock.setter
+    def clock(self, clock: T.Callable[[], float]) -> None:
+        self._clock = clock
+
+    @property
+    def loop(self) -> T.Any:
+        """The asyncio event loop delivering deferred handler calls, if
+        any."""
+
+        return self._loop
+
+    @loop.setter
+    def loop(self, loop: T.Any) -> None:
+        self._loop = loop
+
+    def _allocate(self) -> None:
+        """Replaces the shared empty registry with a dict of this
+        Observable before handlers are registered."""
+
+        if self._events is _EMPTY:
+            self._events = {}
+
+    def _cache(self, event: str, dispatch: T.Optional[T.Callable]) -> None:
+        """Caches the dispatcher of an event, replacing the shared empty
+        cache with a dict of this Observable first."""
+
+        if self._dispatchers is _EMPTY:
+            self._dispatchers = {}
+        self._dispatchers[event] = dispatch
+
+    @property
+    def executor(self) -> T.Optional[Executor]:
+        """The executor all handlers are submitted to, if any."""
+
+        return self._executor
+
+    @executor.setter
+    def executor(self, executor: T.Optional[Executor]) -> None:
+        with self._lock:
+            self._executor = executor
+            self._dispatchers.clear()
+
+    @property
+    def errors(self) -> str:
+        """The policy for handlers raising an exception, one of
+        ERROR_POLICIES."""
+
+        return self._errors
+
+    @errors.setter
+    def errors(self, errors: str) -> None:
+        self._check_errors(errors)
+        with self._lock:
+            self._errors = errors
+            self._dispatchers.clear()
+
+    @property
+    def instrumentation(self) -> T.Optional[Instrumentation]:
+        """The Instrumentation recording triggers and handler calls, if
+        any."""
+
+        return self._instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, instrumentation: T.Optional[Instrumentation]) -> None:
+        with self._lock:
+            self._instrumentation = instrumentation
+            self._dispatchers.clear()
+
+    def add_hook(self, hook: DispatchHook, sample_rate: float = 1.0) -> None:
+        """Adds a hook (see observable.stats.DispatchHook) which is
+        called before and after every handler call of a share of the
+        triggers of this Observable. sample_rate is the probability of
+        a trigger being traced. Triggers which aren't traced only pay
+        for drawing a random number per hook."""
+
+        with self._lock:
+            self._hooks += ((hook, sample_rate),)
+            self._dispatchers.clear()
+
+    def remove_hook(self, hook: DispatchHook) -> None:
+        """Removes a hook added with add_hook.
+        Raises ValueError when the hook wasn't added."""
+
+        with self._lock:
+            hooks = tuple(pair for pair in self._hooks if pair[0] is not hook)
+            if len(hooks) == len(self._hooks):
+                raise ValueError("Hook {!r} wasn't added".format(hook))
+            self._hooks = hooks
+            self._dispatchers.clear()
+
+    @staticmethod
+    def add_global_hook(hook: DispatchHook, sample_rate: float = 1.0) -> None:
+        """Adds a hook like add_hook does, but for all Observables."""
+
+        with _CLASS_LOCK:
+            Observable._global_hooks += ((hook, sample_rate),)
+        Observable._drop_dispatchers()
+
+    @staticmethod
+    def remove_global_hook(hook: DispatchHook) -> None:
+        """Removes a hook added with add_global_hook.
+        Raises ValueError when the hook wasn't added."""
+
+        with _CLASS_LOCK:
+            hooks = Observable._global_hooks
+            Observable._global_hooks = tuple(
+                pair for pair in hooks if pair[0] is not hook)
+            if len(hooks) == len(Observable._global_hooks):
+                raise ValueError("Hook {!r} wasn't added".format(hook))
+        Observable._drop_dispatchers()
+
+    @staticmethod
+    def _drop_dispatchers() -> None:
+        """Starts a new generation of class-level handlers and global
+        hooks, so all Observables drop their cached dispatchers on their
+        next trigger. Has to be called after the change."""
+
+        Observable._class_generation = object()
+
+    def _check_errors(self, errors: str) -> None:
+        """Raises a ValueError for unknown error policies."""
+
+        if errors not in self.ERROR_POLICIES:
+            raise ValueError("errors must be one of {}, not {!r}".format(
+                ", ".join(self.ERROR_POLICIES), errors))
+
+    def _handle_errors(
+            self, event: str, failures: T.List[T.Tuple[T.Callable, Exception]],
+            args: tuple, kw: dict
+    ) -> None:
+        """Handles the failed handlers of a trigger according to the
+        error policy."""
+
+        failures = [(_failed(handler), exc) for handler, exc in failures]
+        if self._errors == "collect":
+            raise DispatchError(event, failures, (args, kw))
+        for handler, exc in failures:
+            # failures of the error event's own handlers are logged below
+            if (self._errors == "event" and event != self.ERROR_EVENT
+                    and self._trigger_soon(self.ERROR_EVENT, event, handler, exc)):
+                continue
+            _LOGGER.error(
+                "Handler %r of event %s failed", handler, event, exc_info=exc)
+
+    def _snapshot(self, event: str) -> T.Tuple[T.Callable, ...]:
+        """Returns an immutable snapshot of the handlers to call when
+        dispatching an event."""
+
+        if (not self._patterns and not self._events.get(event)
+                and event not in self._class_handlers):
+            return ()
+        return self._build_snapshot(event)
+
+    def _build_snapshot(self, event: str) -> T.Tuple[T.Callable, ...]:
+        """Merges the handlers of an event, ordered by priority, into a
+        snapshot."""
+
+        class_handlers = self._class_handlers.get(event)
+        with self._lock:
+            entries = []  # type: T.List[T.Tuple[int, T.Callable]]
+            if class_handlers is not None:
+                entries.extend(zip(class_handlers.priorities, (
+                    _WeaklyBound(h, self) for h in class_handlers.handlers
+                )))
+            # a triggered pattern only matches its own handlers as pattern
+            registry = self._events.get(event)
+            if registry and not is_pattern(event):
+                entries.extend(registry.prioritized())
+            if self._patterns:
+                for pattern in self._patterns.match(event):
+                    entries.extend(
+                        (priority, _with_event(h, event))
+                        for priority, h in self._events[pattern].prioritized()
+                    )
+            snapshot = tuple(h for _, h in _by_priority(entries))
+            if self._executor is not None:
+                snapshot = tuple(
+                    _on_executor(h, self._executor) for h in snapshot
+                )
+        return snapshot
+
+    def _compile(self, event: str) -> T.Optional[T.Callable]:
+        """Compiles and caches the dispatcher of an event, after dropping
+        the dispatchers of an older generation.
+        Returns None when there are no handlers for the event."""
+
+        generation = self._class_generation
+        if self._generation is not generation:
+            with self._lock:
+                self._dispatchers.clear()
+                self._generation = generation
+        # during batches get resolves to the recording dispatcher and
+        # events matching no pattern are cached as None
+        dispatch = self._dispatchers.get(event)
+        if dispatch is not None or event in self._dispatchers:
+            return dispatch
+        if not self._patterns and not self._events.get(event):
+            if event not in self._class_handlers:
+                return None
+            return self._compile_class(event)
+        return self._build_dispatcher(event)
+
+    def _compile_class(self, event: str) -> T.Optional[T.Callable]:
+        """Compiles and caches the _ClassDispatcher of an event with only
+        class-level handlers. With the default settings nothing is
+        compiled and the dispatcher shared by all instances is cached."""
+
+        with self._lock:
+            # on may have registered handlers in the meantime
+            if self._patterns or self._events.get(event):
+                return self._build_dispatcher(event)
+            dispatch = self._dispatchers.get(event)
+            if dispatch is not None:
+                return dispatch
+            class_handlers = self._class_handlers.get(event)
+            if class_handlers is None:
+                return None
+            if (self._executor is None and self._errors == "raise"
+                    and self._instrumentation is None and not self._hooks
+                    and not self._global_hooks):
+                dispatch = class_handlers.dispatcher
+            else:
+                handlers = class_handlers.handlers
+                if self._executor is not None:
+                    handlers = tuple(
+                        _on_executor(h, self._executor) for h in handlers
+                    )
+                dispatch = _ClassDispatcher(self._assemble(event, handlers))
+            self._cache(event, dispatch)
+        return dispatch
+
+    def _build_dispatcher(self, event: str) -> T.Optional[T.Callable]:
+        """Compiles the dispatcher of an event from its snapshot and
+        caches it. Returns None when there are no handlers for the
+        event."""
+
+        with self._lock:
+            handlers = self._build_snapshot(event)
+            dispatch = self._assemble(event, handlers) if handlers else None
+            if (self._patterns
+                    and _RESOLVED_EVENTS_LIMIT <= len(self._dispatchers)):
+                self._dispatchers.clear()
+            # events without handlers are cached as None, so triggering
+            # them again doesn't take the lock
+            self._cache(event, dispatch)
+        return dispatch
+
+    def _assemble(
+            self, event: str, handlers: T.Tuple[T.Callable, ...]
+    ) -> T.Callable:
+        """Compiles the dispatcher calling the given handlers of an event
+        with the error policy, hooks and instrumentation."""
+
+        compile_dispatcher = _WeaklyBound(
+            type(self)._compile_handlers, self, event)
+        dispatch = compile_dispatcher(handlers)
+        hooks = self._global_hooks + self._hooks
+        if hooks:
+            dispatch = _compile_hooked_dispatcher(
+                dispatch, handlers, event, hooks, compile_dispatcher)
+        if self._instrumentation is not None:
+            dispatch = _counted(dispatch, event, self._instrumentation)
+        return dispatch
+
+    def _compile_handlers(
+            self, event: str, handlers: T.Tuple[T.Callable, ...]
+    ) -> T.Callable:
+        """Compiles a dispatcher calling the given handlers of an event
+        according to the error policy and instrumentation."""
+
+        instrumentation = self._instrumentation
+        if instrumentation is not None:
+            handlers = tuple(
+                _InstrumentedHandler(h, event, instrumentation) for h in handlers
+            )
+        if self._errors == "raise":
+            return _compile_dispatcher(handlers)
+        return _compile_isolated_dispatcher(
+            handlers, _WeaklyBound(type(self)._handle_errors, self, event))
+
+    def _invalidate(self, event: str) -> None:
+        """Drops the cached dispatcher of an event after
+        its handlers changed. For wildcard patterns the cache of all
+        events is dropped."""
+
+        if is_pattern(event):
+            self._dispatchers.clear()
+        else:
+            self._dispatchers.pop(event, None)
+
+    def _prune(
+            self, event: str, registry: _EventHandlers, registration: int,
+            priority: int
+    ) -> None:
+        """Removes the registration of a garbage collected weak handler,
+        unless its event was unregistered in the meantime."""
+
+        with self._lock:
+            if self._events.get(event) is registry:
+                registry.discard(registration, priority)
+                self._invalidate(event)
+                self._drop_pattern(event)
+
+    def _drop_pattern(self, event: str) -> None:
+        """Unregisters a wildcard pattern once its last handler was
+        removed, so events aren't matched against it anymore."""
+
+        if (self._patterns is not None and event in self._patterns
+                and not self._events[event]):
+            del self._events[event]
+            self._patterns.remove(event)
+
+    def _defer(self, event: str, handler: _DeferredHandler) -> None:
+        """Schedules the delivery of a deferred call of a handler of an
+        event."""
+
+        if self._loop is None:
+            if self._deferred is _EMPTY:
+                self._deferred = {}
+            self._deferred[id(handler)] = (event, handler)
+            return
+        if handler.timer is not None:
+            handler.timer.cancel()
+        handler.timer = self._loop.call_at(
+            handler.due, self._deliver, event, handler)
+
+    def _cancel(self, handlers: T.Iterable[T.Callable]) -> None:
+        """Drops the deferred calls of unregistered handlers."""
+
+        if not self._deferred and self._loop is None:
+            return
+        for wrapper in handlers:
+            if isinstance(wrapper, _BatchHandler):
+                wrapper = wrapper.handler
+            if isinstance(wrapper, _DeferredHandler):
+                self._deferred.pop(id(wrapper), None)
+                if wrapper.timer is not None:
+                    wrapper.timer.cancel()
+                wrapper.call = wrapper.timer = None
+
+    def _deliver(self, event: str, handler: _DeferredHandler) -> None:
+        """Delivers the deferred call of a handler of an event and handles
+        its exception according to errors."""
+
+        call = handler.call
+        try:
+            handler.deliver()
+        except Exception as exc:  # pylint: disable=broad-except
+            if self._errors == "raise" or call is None:
+                raise
+            self._handle_errors(event, [(handler.handler, exc)], *call)
+
+    def flush(self, force: bool = False) -> int:
+        """Delivers all deferred handler calls which are due according
+        to clock, or all of them when force is True.
+        Returns the number of delivered calls."""
+
+        now = self.clock()
+        delivered = 0
+        for key, (event, handler) in list(self._deferred.items()):
+            if force or handler.due <= now:
+                del self._deferred[key]
+                self._deliver(event, handler)
+                delivered += 1
+        return delivered
+
+    @contextlib.contextmanager
+    def batch(self, coalesce: bool = True) -> T.Iterator[None]:
+        """Context manager suspending trigger in the current thread until
+        the block is left, e.g. for updating many ObservablePropertys at
+        once. The events triggered in the block are recorded and
+        triggered in order at the end of the (outermost) batch. When
+        coalescing, repeated sets of the same ObservableProperty are
+        reduced to one, so handlers of after_set_<name> only see the
+        final value of the property; with notify="changed" they get the
+        value from before the batch as old value and aren't called when
+        the property got that value back. Other events are never
+        coalesced. During a batch, trigger returns True for all events.
+        Triggers of other threads, dispatchers fetched before the batch,
+        trigger_many and submit aren't batched."""
+
+        ident = threading.get_ident()
+        with self._lock:
+            stand_in = self._dispatchers
+            if not isinstance(stand_in, _BatchDispatchers):
+                stand_in = self._dispatchers = _BatchDispatchers(stand_in)
+            nested = ident in stand_in.batches
+            if not nested:
+                batch = stand_in.batches[ident] = _Batch(coalesce)
+        if nested:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                del stand_in.batches[ident]
+                if not stand_in.batches:
+                    # on and off only invalidated the stand-in meanwhile
+                    stand_in.dispatchers.clear()
+                    self._dispatchers = stand_in.dispatchers
+            for event, args, kw in batch.pending():
+                self.trigger(event, *args, **kw)
+
+    def _current_batch(self) -> T.Optional[_Batch]:
+        """Returns the batch of the current thread, if any."""
+
+        dispatchers = self._dispatchers
+        if isinstance(dispatchers, _BatchDispatchers):
+            return dispatchers.batches.get(threading.get_ident())
+        return None
+
+    def dispatcher(self, event: str) -> T.Callable:
+        """Returns a callable which calls all handlers currently
+        registered for the given event with the arguments it is called
+        with, like trigger does, but without looking up the event.
+        The dispatcher is a snapshot: it has to be fetched again after
+        handlers were registered or unregistered for the event.
+        With a single handler the dispatcher may be the handler itself,
+        so StopPropagation raised by it reaches the caller; there are no
+        remaining handlers to skip anyway."""
+
+        dispatch = self._dispatchers.get(event)
+        if dispatch is None or self._generation is not self._class_generation:
+            dispatch = self._compile(event)
+            if dispatch is None:
+                return _noop
+        if dispatch.__class__ is _ClassDispatcher:
+            return functools.partial(dispatch.dispatch, self)
+        return dispatch
 
     def get_all_handlers(self) -> T.Dict[str, T.List[T.Callable]]:
         """Returns a dict with event names as keys and lists of
         registered handlers as values."""
 
-        events = {}
-        for event, handlers in self._events.items():
-            events[event] = list(handlers)
+        with self._lock:
+            events = {}
+            for event, handlers in self._events.items():
+                events[event] = list(handlers)
         return events
 
     def get_handlers(self, event: str) -> T.List[T.Callable]:
         """Returns a list of handlers registered for the given event."""
 
-        return list(self._events.get(event, []))
+        with self._lock:
+            return list(self._events.get(event, ()))
 
     def is_registered(self, event: str, handler: T.Callable) -> bool:
         """Returns whether the given handler is registered for the
         given event."""
 
-        return handler in self._events.get(event, [])
+        handlers = self._events.get(event)
+        return handlers is not None and handler in handlers
 
     def on(  # pylint: disable=invalid-name
-            self, event: str, *handlers: T.Callable
+            self, event: str, *handlers: T.Callable, weak: bool = None,
+            executor: Executor = None, batch: bool = False,
+            debounce: float = None, throttle: float = None,
+            coalesce: bool = False, priority: int = 0
     ) -> T.Callable:
         """Registers one or more handlers to a specified event.
-        This method may as well be used as a decorator for the handler."""
+        This method may as well be used as a decorator for the handler.
+        The event may be a wildcard pattern like "after_set_*" or "db.**";
+        its handlers get the triggered event name as first argument.
+        With weak=True the handlers are only weakly referenced and
+        unregistered automatically once they are garbage collected.
+        weak defaults to the weak_handlers attribute.
+        With an executor the handlers are submitted to it when the event
+        is triggered. Handlers submitted to a ProcessPoolExecutor need to
+        be picklable and can't be registered weakly.
+        With batch=True the handlers are called with a list of argument
+        tuples instead: trigger_many passes all of its items at once,
+        trigger passes a list with a single tuple.
+        With debounce the handlers are only called with the latest
+        arguments once the event wasn't triggered for debounce seconds.
+        With throttle they are called at most once every throttle
+        seconds, with the latest arguments at the end of each interval.
+        With coalesce=True they are only called with the latest arguments
+        on the next flush (or loop iteration). See flush and loop.
+        Handlers with a higher priority are called before handlers with
+        a lower one, no matter where they were registered; handlers with
+        equal priorities are called in the order they were registered."""
+
+        if weak is None:
+            weak = self.weak_handlers
+        if [debounce, throttle, coalesce or None].count(None) < 2:
+            raise ValueError(
+                "Only one of debounce, throttle and coalesce may be given"
+            )
+        clock = self.clock if self.loop is None else self.loop.time
+        defer = functools.partial(self._defer, event)
 
         def _on_wrapper(*handlers: T.Callable) -> T.Callable:
             """wrapper for on decorator"""
-            self._events[event].extend(handlers)
+            # wrap all handlers first, so a handler which can't be
+            # referenced weakly doesn't leave the others half registered
+            wrappers = []  # type: T.List[T.Tuple[T.Callable, T.Optional[_WeakHandler]]]
+            for handler in handlers:
+                wrapper = handler
+                weak_handler = None
+                if weak:
+                    wrapper = weak_handler = _WeakHandler(handler)
+                if executor is not None:
+                    wrapper = _ExecutorHandler(wrapper, executor)
+                if debounce is not None:
+                    wrapper = _DebouncedHandler(wrapper, debounce, clock, defer)
+                elif throttle is not None:
+                    wrapper = _ThrottledHandler(wrapper, throttle, clock, defer)
+                elif coalesce:
+                    wrapper = _CoalescedHandler(wrapper, 0.0, clock, defer)
+                if batch:
+                    wrapper = _BatchHandler(wrapper)
+                wrappers.append((wrapper, weak_handler))
+
+            with self._lock:
+                self._allocate()
+                registry = self._events.get(event)
+                if registry is None:
+                    registry = self._events[event] = _EventHandlers()
+                    if is_pattern(event):
+                        if self._patterns is None:
+                            self._patterns = PatternIndex()
+                        self._patterns.add(event)
+                for wrapper, weak_handler in wrappers:
+                    registration = registry.add(wrapper, priority)
+                    if weak_handler is not None:
+                        weak_handler.prune = functools.partial(
+                            self._prune, event, registry, registration, priority
+                        )
+                self._invalidate(event)
             return handlers[0]
 
         if handlers:
             return _on_wrapper(*handlers)
         return _on_wrapper
 
+    @classmethod
+    def on_class(
+            cls, event: str, *handlers: T.Callable, priority: int = 0
+    ) -> T.Callable:
+        """Registers one or more handlers to a specified event of all
+        instances of this class and its subclasses. The handlers are
+        called with the instance as first argument, before the handlers
+        registered on the instance with the same priority. This method
+        may as well be used as a decorator for the handler. Wildcard
+        patterns aren't supported. priority works like for on."""
+
+        if is_pattern(event):
+            raise ValueError(
+                "Wildcard patterns can't be registered with on_class"
+            )
+
+        def _on_class_wrapper(*handlers: T.Callable) -> T.Callable:
+            """wrapper for on_class decorator"""
+            with _CLASS_LOCK:
+                events = vars(cls).get("_class_events")
+                if events is None:
+                    events = cls._class_events = {}  # type: ignore
+                registry = events.get(event)
+                if registry is None:
+                    registry = events[event] = _EventHandlers()
+                for handler in handlers:
+                    registry.add(handler, priority)
+            cls._update_class_handlers()
+            return handlers[0]
+
+        if handlers:
+            return _on_class_wrapper(*handlers)
+        return _on_class_wrapper
+
+    @classmethod
+    def off_class(  # pylint: disable=keyword-arg-before-vararg
+            cls, event: str = None, *handlers: T.Callable
+    ) -> None:
+        """Unregisters all class-level handlers of this class (if no
+        event is given), a whole event (if no handlers are given) or one
+        or more handlers from an event, like off does for instances.
+        Handlers registered on base classes aren't affected.
+        Raises EventNotFound when the given event isn't registered.
+        Raises HandlerNotFound when a given handler isn't registered."""
+
+        with _CLASS_LOCK:
+            events = vars(cls).get("_class_events", {})
+            if not event:
+                events.clear()
+            elif event not in events:
+                raise EventNotFound(event)
+            elif not handlers:
+                del events[event]
+            else:
+                for callback in handlers:
+                    if not events[event].remove(callback):
+                        raise HandlerNotFound(event, callback)
+        cls._update_class_handlers()
+
+    @classmethod
+    def get_class_handlers(cls, event: str) -> T.List[T.Callable]:
+        """Returns a list of the class-level handlers registered for the
+        given event on this class and its bases."""
+
+        class_handlers = cls._own_class_handlers().get(event)
+        return [] if class_handlers is None else list(class_handlers.handlers)
+
+    @classmethod
+    def _own_class_handlers(cls) -> _ClassHandlers:
+        """Returns the merged class-level handlers of this class. Classes
+        derived after handlers were registered on their bases inherit
+        the handlers of their first base only, so they are merged on
+        first use."""
+
+        if cls._class_handlers and "_class_handlers" not in vars(cls):
+            with _CLASS_LOCK:
+                if "_class_handlers" not in vars(cls):
+                    cls._class_handlers = _merge_class_handlers(cls)
+        return cls._class_handlers
+
+    @classmethod
+    def _update_class_handlers(cls) -> None:
+        """Merges the class-level handlers of this class and all of its
+        subclasses again and drops the caches of their instances."""
+
+        with _CLASS_LOCK:
+            for klass in _subclasses(cls):
+                klass._class_handlers = _merge_class_handlers(klass)
+        cls._drop_dispatchers()
+
     def off(  # pylint: disable=keyword-arg-before-vararg
             self, event: str = None, *handlers: T.Callable
     ) -> None:
@@ -79,54 +1829,241 @@ class Observable:
         Raises EventNotFound when the given event isn't registered.
         Raises HandlerNotFound when a given handler isn't registered."""
 
-        if not event:
-            self._events.clear()
-            return
+        with self._lock:
+            if not event:
+                for registry in self._events.values():
+                    self._cancel(registry)
+                self._events.clear()
+                self._dispatchers.clear()
+                self._patterns = None
+                return
 
-        if event not in self._events:
-            raise EventNotFound(event)
+            if event not in self._events:
+                raise EventNotFound(event)
 
-        if not handlers:
-            self._events.pop(event)
-            return
+            if not handlers:
+                self._cancel(self._events.pop(event))
+                if self._patterns is not None:
+                    self._patterns.remove(event)
+                self._invalidate(event)
+                return
 
-        for callback in handlers:
-            if callback not in self._events[event]:
-                raise HandlerNotFound(event, callback)
-            while callback in self._events[event]:
-                self._events[event].remove(callback)
+            registry = self._events[event]
+            for callback in handlers:
+                removed = registry.remove(callback)
+                if not removed:
+                    raise HandlerNotFound(event, callback)
+                self._cancel(removed)
+                self._invalidate(event)
+            self._drop_pattern(event)
         return
 
-    def once(self, event: str, *handlers: T.Callable) -> T.Callable:
+    def once(
+            self, event: str, *handlers: T.Callable, weak: bool = None,
+            priority: int = 0
+    ) -> T.Callable:
         """Registers one or more handlers to a specified event, but
         removes them when the event is first triggered.
-        This method may as well be used as a decorator for the handler."""
+        This method may as well be used as a decorator for the handler.
+        The handlers are wrapped in one function, which is returned and
+        unregisters itself before calling them in order. It returns the
+        result of a single handler. weak and priority work like for on."""
+
+        if weak is None:
+            weak = self.weak_handlers
 
         def _once_wrapper(*handlers: T.Callable) -> T.Callable:
             """Wrapper for 'once' decorator"""
 
-            def _wrapper(*args: T.Any, **kw: T.Any) -> None:
-                """Wrapper that unregisters itself before executing
-                the handlers"""
-
-                self.off(event, _wrapper)
-                for handler in handlers:
-                    handler(*args, **kw)
-
-            return _wrapper
+            if weak:
+                handlers = tuple(_WeakHandler(handler) for handler in handlers)
+            handler = handlers[0] if len(handlers) == 1 else _Handlers(handlers)
+            return _OnceHandler(handler, self, event)
 
         if handlers:
-            return self.on(event, _once_wrapper(*handlers))
-        return lambda x: self.on(event, _once_wrapper(x))
+            return self.on(
+                event, _once_wrapper(*handlers), weak=False, priority=priority
+            )
+        return lambda x: self.on(
+            event, _once_wrapper(x), weak=False, priority=priority
+        )
 
     def trigger(self, event: str, *args: T.Any, **kw: T.Any) -> bool:
         """Triggers all handlers which are subscribed to an event.
+        A handler raising StopPropagation skips the remaining handlers.
+        Exceptions raised by handlers are handled according to errors.
         Returns True when there were callbacks to execute, False otherwise."""
 
-        callbacks = list(self._events.get(event, []))
-        if not callbacks:
+        dispatch = self._dispatchers.get(event)
+        if dispatch is None or self._generation is not self._class_generation:
+            dispatch = self._compile(event)
+            if dispatch is None:
+                return False
+
+        try:
+            if dispatch.__class__ is _ClassDispatcher:
+                dispatch.dispatch(self, *args, **kw)
+            else:
+                dispatch(*args, **kw)
+        except StopPropagation:
+            pass
+        return True
+
+    def _trigger_soon(self, event: str, *args: T.Any, **kw: T.Any) -> bool:
+        """Triggers an event from synchronous code, like ObservableProperty
+        and the error policy do. Returns whether there were handlers."""
+
+        return self.trigger(event, *args, **kw)
+
+    def results(self, event: str, *args: T.Any, **kw: T.Any) -> T.Iterator[T.Any]:
+        """Triggers the handlers which are subscribed to an event one by
+        one and yields their return values. A handler is only called
+        when the next value is requested, so stopping the iteration
+        skips the remaining handlers, just like a handler raising
+        StopPropagation, whose value is yielded last. The handlers are
+        looked up when the first value is requested. Unlike trigger,
+        results isn't deferred by batch. Unless errors is "raise", failed
+        handlers yield nothing and are handled according to errors once
+        all handlers were called."""
+
+        failures = []  # type: T.List[T.Tuple[T.Callable, Exception]]
+        for handler in self._snapshot(event):
+            try:
+                result = handler(*args, **kw)
+            except StopPropagation as stop:
+                yield stop.value
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                if self._errors == "raise":
+                    raise
+                failures.append((handler, exc))
+                continue
+            yield result
+        if failures:
+            self._handle_errors(event, failures, args, kw)
+
+    def reduce(
+            self, event: str, function: T.Callable[[T.Any, T.Any], T.Any],
+            initial: T.Any, *args: T.Any, **kw: T.Any
+    ) -> T.Any:
+        """Triggers the handlers which are subscribed to an event and
+        returns the return values of the handlers reduced with function,
+        like functools.reduce(function, results, initial) does.
+        Returns initial when there are no handlers."""
+
+        return functools.reduce(
+            function, self.results(event, *args, **kw), initial
+        )
+
+    def trigger_many(
+            self, event: str, items: T.Iterable[T.Sequence[T.Any]], **kw: T.Any
+    ) -> bool:
+        """Triggers all handlers which are subscribed to an event once for
+        every tuple of positional arguments in items, which is cheaper
+        than calling trigger for each of them. The handlers are looked up
+        only once and every handler processes all items before the next
+        handler runs. Batch handlers are called only once with the list
+        of all items. The keyword arguments are passed to every call.
+        A handler raising StopPropagation skips the remaining handlers
+        for the item it was called with, or for all items when it's a
+        batch handler. Exceptions raised by handlers are handled
+        according to errors once all handlers were called, with the
+        failed handlers bound to the positional arguments of the item
+        they failed for, e.g. for DispatchError.retry.
+        Returns True when there were callbacks to execute, False otherwise."""
+
+        handlers = self._snapshot(event)
+        if not handlers:
             return False
 
-        for callback in callbacks:
-            callback(*args, **kw)
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        failures = []  # type: T.List[T.Tuple[T.Callable, Exception]]
+        for handler in handlers:
+            if isinstance(handler, _BatchHandler):
+                try:
+                    handler.handler(items, **kw)
+                except StopPropagation:
+                    break
+                except Exception as exc:  # pylint: disable=broad-except
+                    if self._errors == "raise":
+                        raise
+                    failures.append(
+                        (functools.partial(_failed(handler.handler), items), exc))
+                continue
+            stopped = set()  # type: T.Set[int]
+            for index, args in enumerate(items):
+                try:
+                    handler(*args, **kw)
+                except StopPropagation:
+                    stopped.add(index)
+                except Exception as exc:  # pylint: disable=broad-except
+                    if self._errors == "raise":
+                        raise
+                    failures.append((functools.partial(_failed(handler), *args), exc))
+            if stopped:
+                items = [
+                    args for index, args in enumerate(items) if index not in stopped
+                ]
+                if not items:
+                    break
+        if failures:
+            self._handle_errors(event, failures, (), kw)
         return True
+
+    def submit(self, event: str, *args: T.Any, **kw: T.Any) -> T.List[Future]:
+        """Triggers all handlers which are subscribed to an event and
+        returns a future for each of them. Handlers registered with an
+        executor (or all handlers when the Observable has an executor)
+        are submitted to it, other handlers are called right away and
+        their result or exception is set on a completed future.
+        A handler raising StopPropagation gets its value as result and
+        the remaining handlers aren't called and get no futures.
+        Unless errors is "raise", the exceptions set on futures are also
+        handled according to errors once all handlers were called.
+        concurrent.futures.wait can be used to wait for all of them."""
+
+        futures = []
+        failures = []  # type: T.List[T.Tuple[T.Callable, Exception]]
+        for handler in self._snapshot(event):
+            if isinstance(handler, _ExecutorHandler):
+                futures.append(handler(*args, **kw))
+                continue
+            future = Future()  # type: Future
+            futures.append(future)
+            try:
+                future.set_result(handler(*args, **kw))
+            except StopPropagation as stop:
+                future.set_result(stop.value)
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+                failures.append((handler, exc))
+        if failures and self._errors != "raise":
+            self._handle_errors(event, failures, args, kw)
+        return futures
+
+
+class WeakObservable(Observable):
+    """Observable which only holds weak references to its handlers,
+    unless on or once are explicitly called with weak=False."""
+
+    __slots__ = ()
+
+    weak_handlers = True
+
+
+class ThreadSafeObservable(Observable):
+    """Observable whose handlers may be registered and unregistered from
+    multiple threads while others trigger events.
+
+    Changes to the handlers are serialized by a lock, which is also
+    taken when a snapshot or dispatcher has to be compiled after a
+    change. trigger itself only reads the current, immutable dispatcher
+    and never waits for the lock otherwise."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, *args: T.Any, **kwargs: T.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
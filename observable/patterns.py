@@ -0,0 +1,119 @@
+"""
+    Wildcard event patterns for subscribing to many events at once.
+
+    Event names are split into segments at dots. Within a segment ``*``
+    matches any number of characters, while a ``**`` segment matches any
+    number of segments (including none), e.g. ``after_set_*`` matches
+    ``after_set_x`` and ``db.**`` matches ``db``, ``db.insert`` and
+    ``db.insert.users``.
+"""
+
+import re
+import typing as T
+
+
+__all__ = ["is_pattern", "PatternIndex"]
+
+
+def is_pattern(event: str) -> bool:
+    """Returns whether the given event name is a wildcard pattern."""
+
+    return "*" in event
+
+
+class _Node:
+    """Node of the pattern trie, representing a segment"""
+
+    __slots__ = ("children", "globs", "globstar", "patterns")
+
+    def __init__(self) -> None:
+        self.children = {}  # type: T.Dict[str, _Node]
+        self.globs = {}  # type: T.Dict[str, T.Tuple[T.Pattern, _Node]]
+        self.globstar = None  # type: T.Optional[_Node]
+        self.patterns = set()  # type: T.Set[str]
+
+
+class PatternIndex:
+    """Trie of wildcard patterns, which finds all patterns matching an
+    event name in time proportional to the number of its segments
+    rather than to the number of patterns."""
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._order = {}  # type: T.Dict[str, int]
+        self._counter = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._order)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._order
+
+    def add(self, pattern: str) -> None:
+        """Adds a pattern to the index, unless it's already there."""
+
+        if pattern in self._order:
+            return
+        node = self._root
+        for segment in pattern.split("."):
+            if segment == "**":
+                if node.globstar is None:
+                    node.globstar = _Node()
+                node = node.globstar
+            elif "*" in segment:
+                if segment not in node.globs:
+                    regex = re.compile(re.escape(segment).replace(r"\*", ".*"))
+                    node.globs[segment] = (regex, _Node())
+                node = node.globs[segment][1]
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.patterns.add(pattern)
+        self._order[pattern] = self._counter
+        self._counter += 1
+
+    def remove(self, pattern: str) -> None:
+        """Removes a pattern from the index, if it's there. Trie nodes
+        are kept for patterns which may be added again."""
+
+        if self._order.pop(pattern, None) is None:
+            return
+        node = self._root  # type: T.Optional[_Node]
+        for segment in pattern.split("."):
+            assert node is not None
+            if segment == "**":
+                node = node.globstar
+            elif "*" in segment:
+                node = node.globs[segment][1]
+            else:
+                node = node.children[segment]
+        assert node is not None
+        node.patterns.discard(pattern)
+
+    def match(self, event: str) -> T.List[str]:
+        """Returns all patterns matching the given event name, in the
+        order they were added to the index."""
+
+        segments = event.split(".")
+        matches = set()  # type: T.Set[str]
+        visited = set()  # type: T.Set[T.Tuple[int, int]]
+
+        def _walk(node: _Node, index: int) -> None:
+            if (id(node), index) in visited:
+                return
+            visited.add((id(node), index))
+            if node.globstar is not None:
+                for rest in range(index, len(segments) + 1):
+                    _walk(node.globstar, rest)
+            if index == len(segments):
+                matches.update(node.patterns)
+                return
+            segment = segments[index]
+            child = node.children.get(segment)
+            if child is not None:
+                _walk(child, index + 1)
+            for regex, child in node.globs.values():
+                if regex.fullmatch(segment):
+                    _walk(child, index + 1)
+
+        _walk(self._root, 0)
+        return sorted(matches, key=self._order.__getitem__)
@@ -5,11 +5,40 @@
 import typing as T
 
 import functools
+import operator
 
 from .core import Observable
 
 
-__all__ = ["ObservableProperty"]
+__all__ = ["ObservableProperty", "UNSET"]
+
+
+#: names of all events an ObservableProperty can trigger, without the name
+EVENTS = frozenset(
+    "{}_{}".format(when, action)
+    for when in ("before", "after")
+    for action in ("get", "set", "del")
+)
+
+#: names of the before and after events of an action, see _update_events
+_Events = T.Optional[T.Tuple[T.Optional[str], T.Optional[str]]]
+
+
+class _Unset:
+    """Type of UNSET."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "UNSET"
+
+    def __reduce__(self) -> str:
+        return "UNSET"
+
+
+#: old value passed with notify="changed" when the getter raised
+#: AttributeError, e.g. on the first set in __init__
+UNSET = _Unset()
 
 
 def _preserve_settings(method: T.Callable) -> T.Callable:
@@ -23,76 +52,268 @@ def _preserve_settings(method: T.Callable) -> T.Callable:
         new = method(old, handler)  # type: ObservableProperty
         new.event = old.event
         new.observable = old.observable
+        new.events = old.events
+        new.notify = old.notify
+        new.compare = old.compare
         return new
 
     return _wrapper
 
 
+def _class_handled(observable: Observable, *events: T.Optional[str]) -> bool:
+    """Returns whether the class of an Observable has class-level handlers
+    for any of the given events."""
+
+    # pylint: disable=protected-access
+    return any(event in observable._class_handlers for event in events)
+
+
 class ObservableProperty(property):
     """
     A property that can be observed easily by listening for some special,
     auto-generated events.
+
+    The names of the events and the way to find the Observable object
+    are worked out once when event or observable are set, so accesses
+    don't have to. When the Observable has no handlers for the before
+    and after events of an access, the events aren't triggered at all
+    and the access costs little more than one of a builtin property.
+
+    events optionally selects which events are triggered at all, e.g.
+    {"after_set"}. Actions without selected events don't even look for
+    the Observable object.
+
+    With notify="changed" the set events are only triggered when the new
+    value differs from the current one, which is then passed to the
+    handlers as second argument. compare decides how values are
+    compared: by "equality", by "identity" or with a callable which
+    returns True when its two arguments, the old and the new value, are
+    to be considered the same. When the getter raises AttributeError,
+    because the value wasn't set yet, the events are always triggered
+    with UNSET as old value.
     """
 
     def __init__(
             self, *args: T.Any,
             event: str = None, observable: T.Union[Observable, str] = None,
+            events: T.Iterable[str] = None, notify: str = "always",
+            compare: T.Union[str, T.Callable[[T.Any, T.Any], bool]] = "equality",
             **kwargs: T.Any
     ) -> None:
+        if notify not in ("always", "changed"):
+            raise ValueError(
+                "notify must be 'always' or 'changed', not {!r}".format(notify)
+            )
+        if compare not in ("equality", "identity") and not callable(compare):
+            raise ValueError(
+                "compare must be 'equality', 'identity' or a callable, "
+                "not {!r}".format(compare)
+            )
         super().__init__(*args, **kwargs)
-        self.event = event
+        self._event = event
+        self._selected_events = None  # type: T.Optional[T.FrozenSet[str]]
+        self._get_events = None  # type: _Events
+        self._set_events = None  # type: _Events
+        self._del_events = None  # type: _Events
         self.observable = observable
+        self.events = events  # type: ignore
+        self.notify = notify
+        self.compare = compare
+
+    @property
+    def events(self) -> T.Optional[T.FrozenSet[str]]:
+        """The selected events (like "after_set") or None for all."""
+
+        return self._selected_events
+
+    @events.setter
+    def events(self, events: T.Optional[T.Iterable[str]]) -> None:
+        if events is not None:
+            events = frozenset(events)
+            if not events <= EVENTS:
+                raise ValueError("Unknown events: {}".format(
+                    ", ".join(sorted(events - EVENTS))))
+        self._selected_events = events
+        self._update_events()
+
+    @property
+    def event(self) -> T.Optional[str]:
+        """Name used in event names instead of the function names."""
+
+        return self._event
+
+    @event.setter
+    def event(self, event: T.Optional[str]) -> None:
+        self._event = event
+        self._update_events()
+
+    @property
+    def observable(self) -> T.Union[Observable, str, None]:
+        """Observable object (or the name of the holder's attribute
+        referencing it) to trigger events on. When None, the holder
+        itself has to be an Observable."""
+
+        return self._observable
+
+    @observable.setter
+    def observable(self, observable: T.Union[Observable, str, None]) -> None:
+        self._observable = observable
+        if isinstance(observable, str):
+            getter = operator.attrgetter(observable)  # type: T.Optional[T.Callable]
+        elif observable is not None:
+            getter = lambda holder: observable  # noqa: E731
+        else:
+            getter = None
+        self._observable_getter = getter
+
+    def _update_events(self) -> None:
+        """Precomputes the names of the before and after events of all
+        supported actions."""
+
+        self._get_events = self._event_names("get", self.fget)
+        self._set_events = self._event_names("set", self.fset)
+        self._del_events = self._event_names("del", self.fdel)
+
+    def _event_names(self, action: str, func: T.Optional[T.Callable]) -> _Events:
+        """Returns the names of the before and after events of an action.
+        Unselected events are None and actions without a function or any
+        selected events get None instead of a pair."""
+
+        if func is None:
+            return None
+        name = func.__name__ if self._event is None else self._event
+        before, after = (
+            "{}_{}_{}".format(when, action, name)
+            if self._selected_events is None
+            or "{}_{}".format(when, action) in self._selected_events
+            else None
+            for when in ("before", "after")
+        )
+        if before is None and after is None:
+            return None
+        return before, after
+
+    def _no_observable(self) -> TypeError:
+        """Returns the error raised when there's no Observable object
+        to trigger events on."""
+
+        return TypeError(
+            "This ObservableProperty is no member of an Observable "
+            "object. Specify where to find the Observable object for "
+            "triggering events with the observable keyword argument "
+            "when initializing the ObservableProperty."
+        )
+
+    # pylint: disable=protected-access
 
     def __delete__(self, instance: T.Any) -> None:
-        if self.fdel is not None:
-            self._trigger_event(instance, self.fdel.__name__, "before_del")
-        super().__delete__(instance)
-        self._trigger_event(instance, self.fdel.__name__, "after_del")
+        if self.fdel is None:
+            super().__delete__(instance)
+            return
+        if self._del_events is None:
+            self.fdel(instance)
+            return
+        getter = self._observable_getter
+        observable = instance if getter is None else getter(instance)
+        try:
+            events = observable._events
+        except AttributeError:
+            raise self._no_observable() from None
+        before, after = self._del_events
+        if not (before in events or after in events or observable._patterns
+                or observable._class_handlers
+                and _class_handled(observable, before, after)):
+            self.fdel(instance)
+            return
+        if before is not None:
+            observable._trigger_soon(before)
+        self.fdel(instance)
+        if after is not None:
+            observable._trigger_soon(after)
 
     def __get__(self, instance: T.Any, owner: T.Any = None) -> T.Any:
-        if instance is None:
+        if instance is None or self.fget is None:
             return super().__get__(instance, owner)
-        if self.fget is not None:
-            self._trigger_event(instance, self.fget.__name__, "before_get")
-        value = super().__get__(instance, owner)
-        if instance is None:
-            return value
-        self._trigger_event(instance, self.fget.__name__, "after_get", value)
+        if self._get_events is None:
+            return self.fget(instance)
+        getter = self._observable_getter
+        observable = instance if getter is None else getter(instance)
+        try:
+            events = observable._events
+        except AttributeError:
+            raise self._no_observable() from None
+        before, after = self._get_events
+        if not (before in events or after in events or observable._patterns
+                or observable._class_handlers
+                and _class_handled(observable, before, after)):
+            return self.fget(instance)
+        if before is not None:
+            observable._trigger_soon(before)
+        value = self.fget(instance)
+        if after is not None:
+            observable._trigger_soon(after, value)
         return value
 
     def __set__(self, instance: T.Any, value: T.Any) -> None:
-        if self.fset is not None:
-            self._trigger_event(instance, self.fset.__name__,
-                                "before_set", value)
-        super().__set__(instance, value)
-        self._trigger_event(instance, self.fset.__name__, "after_set", value)
-
-    def _trigger_event(
-            self, holder: T.Any, alt_name: str, action: str, *event_args: T.Any
-    ) -> None:
-        """Triggers an event on the associated Observable object.
-        The Holder is the object this property is a member of, alt_name
-        is used as the event name when self.event is not set, action is
-        prepended to the event name and event_args are passed through
-        to the registered event handlers."""
-
-        if isinstance(self.observable, Observable):
-            observable = self.observable
-        elif isinstance(self.observable, str):
-            observable = getattr(holder, self.observable)
-        elif isinstance(holder, Observable):
-            observable = holder
-        else:
-            raise TypeError(
-                "This ObservableProperty is no member of an Observable "
-                "object. Specify where to find the Observable object for "
-                "triggering events with the observable keyword argument "
-                "when initializing the ObservableProperty."
-            )
+        if self.fset is None:
+            super().__set__(instance, value)
+            return
+        if self._set_events is None:
+            self.fset(instance, value)
+            return
+        getter = self._observable_getter
+        observable = instance if getter is None else getter(instance)
+        try:
+            events = observable._events
+        except AttributeError:
+            raise self._no_observable() from None
+        before, after = self._set_events
+        if not (before in events or after in events or observable._patterns
+                or observable._class_handlers
+                and _class_handled(observable, before, after)):
+            self.fset(instance, value)
+            return
+        args = (value,)  # type: T.Tuple[T.Any, ...]
+        if self.notify == "changed":
+            if self.fget is None:
+                raise AttributeError(
+                    "notify='changed' requires a getter for the old value"
+                )
+            try:
+                old = self.fget(instance)
+            except AttributeError:
+                old = UNSET
+            if self._unchanged(old, value):
+                self.fset(instance, value)
+                return
+            args = (value, old)
+        batch = observable._current_batch()
+        if batch is not None and batch.coalesce:
+            self.fset(instance, value)
+            batch.record_set(
+                instance, self._set_events, args,
+                self._unchanged if self.notify == "changed" else None)
+            return
+        if before is not None:
+            observable._trigger_soon(before, *args)
+        self.fset(instance, value)
+        if after is not None:
+            observable._trigger_soon(after, *args)
+
+    # pylint: enable=protected-access
+
+    def _unchanged(self, old: T.Any, value: T.Any) -> bool:
+        """Compares the old and the new value according to compare.
+        Values are never the same as UNSET."""
 
-        name = alt_name if self.event is None else self.event
-        event = "{}_{}".format(action, name)
-        observable.trigger(event, *event_args)
+        if old is UNSET:
+            return False
+        compare = self.compare
+        if callable(compare):
+            return bool(compare(old, value))
+        if compare == "identity":
+            return old is value
+        return bool(old == value)
 
     deleter = _preserve_settings(property.deleter)
     getter = _preserve_settings(property.getter)
@@ -100,9 +321,14 @@ class ObservableProperty(property):
 
     @classmethod
     def create_with(
-            cls, event: str = None, observable: T.Union[str, Observable] = None
+            cls, event: str = None, observable: T.Union[str, Observable] = None,
+            events: T.Iterable[str] = None, notify: str = "always",
+            compare: T.Union[str, T.Callable[[T.Any, T.Any], bool]] = "equality"
     ) -> T.Callable[..., "ObservableProperty"]:
         """Creates a partial application of ObservableProperty with
-        event and observable preset."""
+        event, observable, events, notify and compare preset."""
 
-        return functools.partial(cls, event=event, observable=observable)
+        return functools.partial(
+            cls, event=event, observable=observable, events=events,
+            notify=notify, compare=compare
+        )
@@ -0,0 +1,197 @@
+"""
+    Deferred event dispatching by background worker threads.
+"""
+
+import collections
+import logging
+import threading
+import typing as T
+
+from .core import Observable, ThreadSafeObservable
+
+
+__all__ = ["QueuedObservable"]
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class QueuedObservable(ThreadSafeObservable):
+    """
+    An Observable whose trigger only puts the event and its arguments
+    into a bounded queue, which worker threads take them from to call
+    the handlers. Emitters don't wait for the handlers that way, but
+    handlers run in order only with a single worker.
+
+    The policy decides what trigger does when the queue is full:
+
+    * ``"block"`` waits until a worker took an event from the queue,
+      except in handlers, which would wait for their own worker: their
+      triggers are dispatched right away instead
+    * ``"drop_oldest"`` drops the oldest queued event
+    * ``"drop_newest"`` drops the event being triggered
+
+    Exceptions raised by handlers are handled according to errors and
+    logged when they end up in a worker. Only trigger is queued; all
+    other methods, like submit and trigger_many, call handlers right
+    away. Call close (or use the QueuedObservable as context manager)
+    to stop the workers once all queued events were dispatched.
+    """
+
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    __slots__ = (
+        "maxsize", "policy", "_queue", "_mutex", "_not_empty", "_not_full",
+        "_done", "_workers", "_closed", "_pending", "_dropped", "_max_depth",
+    )
+
+    def __init__(
+            self, maxsize: int = 1024, workers: int = 1, policy: str = "block",
+            **kwargs: T.Any
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if policy not in self.POLICIES:
+            raise ValueError("policy must be one of {}, not {!r}".format(
+                ", ".join(self.POLICIES), policy))
+        super().__init__(**kwargs)
+        self.maxsize = maxsize
+        self.policy = policy
+        self._queue = collections.deque()  # type: T.Deque[T.Tuple[str, tuple, dict]]
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+        self._done = threading.Condition(self._mutex)
+        self._closed = False
+        #: number of queued events and events being dispatched
+        self._pending = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._workers = [
+            threading.Thread(
+                target=self._work, name="QueuedObservable-{}".format(number),
+                daemon=True)
+            for number in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> "QueuedObservable":
+        return self
+
+    def __exit__(self, *exc_info: T.Any) -> None:
+        self.close()
+
+    def trigger(self, event: str, *args: T.Any, **kw: T.Any) -> bool:
+        """Queues a trigger of an event, which a worker dispatches later.
+        Triggers of handlers which would have to wait for a full queue
+        are dispatched right away instead.
+        Returns True when the trigger was queued and False when it was
+        dropped. Raises RuntimeError when the QueuedObservable is
+        closed."""
+
+        dispatch = False
+        with self._mutex:
+            if self._closed:
+                raise RuntimeError("Can't trigger events after close")
+            if len(self._queue) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self._dropped += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self._pending -= 1
+                    self._dropped += 1
+                elif self._in_worker():
+                    # waiting would block the worker which has to make room
+                    dispatch = True
+                else:
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        raise RuntimeError("Can't trigger events after close")
+            if not dispatch:
+                self._queue.append((event, args, kw))
+                self._pending += 1
+                self._max_depth = max(self._max_depth, len(self._queue))
+                self._not_empty.notify()
+        if dispatch:
+            Observable.trigger(self, event, *args, **kw)
+        return True
+
+    def _in_worker(self) -> bool:
+        """Returns whether the current thread is one of the workers."""
+
+        return threading.current_thread() in self._workers
+
+    def _work(self) -> None:
+        """Dispatches queued events until the QueuedObservable is closed
+        and the queue is empty."""
+
+        while True:
+            with self._mutex:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                event, args, kw = self._queue.popleft()
+                self._not_full.notify()
+            try:
+                Observable.trigger(self, event, *args, **kw)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Dispatching event %s failed", event)
+            finally:
+                with self._mutex:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._done.notify_all()
+
+    def queue_stats(self) -> T.Dict[str, int]:
+        """Returns the current number of queued events as "depth", the
+        highest depth so far as "max_depth", the number of queued events
+        and events being dispatched as "pending", the number of
+        "dropped" events and the "maxsize" of the queue."""
+
+        with self._mutex:
+            return {
+                "depth": len(self._queue),
+                "max_depth": self._max_depth,
+                "pending": self._pending,
+                "dropped": self._dropped,
+                "maxsize": self.maxsize,
+            }
+
+    def drain(self, timeout: float = None) -> bool:
+        """Waits until all queued events were dispatched. Returns False
+        when that didn't happen within timeout seconds. Raises
+        RuntimeError when called by a handler, which would wait for its
+        own event."""
+
+        if self._in_worker():
+            raise RuntimeError("Can't drain from a handler")
+        with self._mutex:
+            return self._done.wait_for(lambda: not self._pending, timeout)
+
+    def close(self, drain: bool = True, timeout: float = None) -> bool:
+        """Stops accepting triggers and stops the workers once they
+        dispatched the queued events. Without drain, queued events are
+        dropped instead. Returns False when the workers didn't stop
+        within timeout seconds."""
+
+        with self._mutex:
+            self._closed = True
+            if not drain:
+                self._dropped += len(self._queue)
+                self._pending -= len(self._queue)
+                self._queue.clear()
+                if not self._pending:
+                    self._done.notify_all()
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout)
+        return not any(worker.is_alive() for worker in self._workers
+                       if worker is not threading.current_thread())
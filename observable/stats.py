@@ -0,0 +1,196 @@
+"""
+    Opt-in instrumentation of event dispatching.
+"""
+
+import bisect
+import threading
+import time
+import typing as T
+
+
+__all__ = ["DispatchHook", "Instrumentation", "prometheus_text"]
+
+
+#: upper bounds in seconds of the default handler latency histogram buckets
+BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0
+)
+
+
+class _HandlerStats:
+    """Call counts and latency histogram of a single handler."""
+
+    __slots__ = ("calls", "errors", "seconds", "counts")
+
+    def __init__(self, buckets: int) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.counts = [0] * (buckets + 1)
+
+
+class Instrumentation:
+    """
+    Records how often events are triggered and how often and how long
+    their handlers are called.
+
+    Assign an Instrumentation to the instrumentation attribute of one or
+    more Observables to record their triggers. Only triggers through
+    trigger and dispatchers are recorded and only for events with
+    handlers. Handlers are identified by their qualified name, so
+    handlers with the same name of an event share their statistics.
+
+    buckets are the upper bounds of the latency histogram in seconds
+    and clock is used to time handler calls.
+    """
+
+    def __init__(
+            self, buckets: T.Sequence[float] = BUCKETS,
+            clock: T.Callable[[], float] = time.perf_counter
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._triggers = {}  # type: T.Dict[str, int]
+        self._handlers = {}  # type: T.Dict[T.Tuple[str, str], _HandlerStats]
+
+    def record_trigger(self, event: str) -> None:
+        """Records a trigger of an event."""
+
+        with self._lock:
+            self._triggers[event] = self._triggers.get(event, 0) + 1
+
+    def record_call(
+            self, event: str, handler: str, seconds: float, failed: bool = False
+    ) -> None:
+        """Records a call of a handler of an event which took the given
+        number of seconds and whether it raised an exception."""
+
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            stats = self._handlers.get((event, handler))
+            if stats is None:
+                stats = self._handlers[event, handler] = _HandlerStats(
+                    len(self.buckets))
+            stats.calls += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.counts[index] += 1
+
+    def reset(self) -> None:
+        """Drops everything recorded so far."""
+
+        with self._lock:
+            self._triggers.clear()
+            self._handlers.clear()
+
+    def stats(self) -> T.Dict[str, T.Dict[str, T.Any]]:
+        """Returns a snapshot of the recorded statistics: a dict with
+        event names as keys and dicts with the number of "triggers" and
+        the statistics of the "handlers" by name as values. The
+        statistics of a handler are the number of "calls" and "errors",
+        the total "seconds" spent and the "histogram", a list of
+        (upper bound, cumulative number of calls) pairs ending with
+        infinity as upper bound."""
+
+        bounds = self.buckets + (float("inf"),)
+        with self._lock:
+            events = {
+                event: {"triggers": triggers, "handlers": {}}
+                for event, triggers in self._triggers.items()
+            }  # type: T.Dict[str, T.Dict[str, T.Any]]
+            for (event, handler), stats in self._handlers.items():
+                cumulative = 0
+                histogram = []
+                for bound, count in zip(bounds, stats.counts):
+                    cumulative += count
+                    histogram.append((bound, cumulative))
+                event_stats = events.setdefault(
+                    event, {"triggers": 0, "handlers": {}})
+                event_stats["handlers"][handler] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "seconds": stats.seconds,
+                    "histogram": histogram,
+                }
+        return events
+
+    def export(self, exporter: T.Callable[[T.Dict[str, T.Any]], T.Any]) -> T.Any:
+        """Passes a snapshot of the statistics to an exporter, like
+        prometheus_text, and returns its result."""
+
+        return exporter(self.stats())
+
+
+class DispatchHook:
+    """
+    Base class for hooks tracing single handler calls, see
+    Observable.add_hook and Observable.add_global_hook. Hooks don't
+    have to inherit from it as long as they implement both methods.
+    """
+
+    def before(self, event: str, handler: T.Callable, args: tuple, kw: dict) -> None:
+        """Called before a handler of an event is called with args
+        and kw."""
+
+    def after(
+            self, event: str, handler: T.Callable, args: tuple, kw: dict,
+            seconds: float, exception: T.Optional[BaseException]
+    ) -> None:
+        """Called after a handler of an event was called with args and
+        kw, with the seconds the call took and the exception it raised,
+        if any."""
+
+
+def _label(value: str) -> str:
+    """Escapes a Prometheus label value."""
+
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text(
+        stats: T.Dict[str, T.Dict[str, T.Any]], prefix: str = "observable"
+) -> str:
+    """Formats statistics returned by Instrumentation.stats in the
+    Prometheus text exposition format."""
+
+    triggers = []
+    calls = []
+    errors = []
+    durations = []
+    for event, event_stats in sorted(stats.items()):
+        labels = 'event="{}"'.format(_label(event))
+        triggers.append("{}_triggers_total{{{}}} {}".format(
+            prefix, labels, event_stats["triggers"]))
+        for handler, handler_stats in sorted(event_stats["handlers"].items()):
+            handler_labels = '{},handler="{}"'.format(labels, _label(handler))
+            calls.append("{}_handler_calls_total{{{}}} {}".format(
+                prefix, handler_labels, handler_stats["calls"]))
+            errors.append("{}_handler_errors_total{{{}}} {}".format(
+                prefix, handler_labels, handler_stats["errors"]))
+            for bound, count in handler_stats["histogram"]:
+                durations.append(
+                    '{}_handler_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                        prefix, handler_labels,
+                        "+Inf" if bound == float("inf") else repr(bound), count))
+            durations.append("{}_handler_duration_seconds_sum{{{}}} {!r}".format(
+                prefix, handler_labels, handler_stats["seconds"]))
+            durations.append("{}_handler_duration_seconds_count{{{}}} {}".format(
+                prefix, handler_labels, handler_stats["calls"]))
+
+    lines = []
+    for name, kind, help_text, samples in (
+            ("triggers_total", "counter", "Number of triggers of an event.",
+             triggers),
+            ("handler_calls_total", "counter", "Number of calls of a handler.",
+             calls),
+            ("handler_errors_total", "counter",
+             "Number of calls of a handler which raised an exception.", errors),
+            ("handler_duration_seconds", "histogram",
+             "Duration of handler calls in seconds.", durations),
+    ):
+        if samples:
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+            lines.extend(samples)
+    return "".join(line + "\n" for line in lines)
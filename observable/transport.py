@@ -0,0 +1,373 @@
+"""
+    Bridging Observables of processes on the same host over Unix domain
+    sockets.
+"""
+
+import functools
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import typing as T
+
+from .core import EventNotFound, HandlerNotFound, Observable
+from .patterns import is_pattern
+
+
+__all__ = ["JSONSerializer", "SocketBridge"]
+
+
+_LOGGER = logging.getLogger(__name__)
+
+#: maximum size of a datagram in bytes, larger batches are split
+MAX_DATAGRAM = 65536
+
+#: kinds of datagrams, sent as their first byte
+_EVENTS, _HELLO, _BYE = b"E", b"H", b"B"
+
+_SUFFIX = ".sock"
+
+_COUNTER = itertools.count()
+
+
+def _same_trigger(
+        first: T.Tuple[str, T.Sequence, dict], second: T.Tuple[str, T.Sequence, dict]
+) -> bool:
+    """Returns whether two (event, args, kw) triggers are of the same event
+    with the very same arguments."""
+
+    event, args, kw = first
+    other_event, other_args, other_kw = second
+    return (
+        event == other_event and len(args) == len(other_args)
+        and all(arg is other for arg, other in zip(args, other_args))
+        and kw.keys() == other_kw.keys()
+        and all(kw[key] is other_kw[key] for key in kw)
+    )
+
+
+class JSONSerializer:
+    """Serializer encoding events as JSON, the default of SocketBridge.
+    It's slower than pickle, but doesn't execute code sent by peers.
+    Tuples in arguments arrive as lists."""
+
+    @staticmethod
+    def dumps(obj: T.Any) -> bytes:
+        """Encodes an object."""
+
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def loads(data: bytes) -> T.Any:
+        """Decodes an object encoded by dumps."""
+
+        return json.loads(data.decode("utf-8"))
+
+
+class SocketBridge:
+    """
+    Forwards triggers of events of an Observable to the Observables of
+    all other SocketBridges using the same directory, usually in other
+    processes on the same host, and triggers the events received from
+    them.
+
+    Each bridge binds a Unix datagram socket in directory and finds its
+    peers by the sockets in there. events are the names or wildcard
+    patterns of the events to forward. Triggers are collected and sent
+    by a background thread, which batches all triggers made while it
+    was busy or during the optional linger seconds. serializer is any
+    object with dumps and loads functions, like JSONSerializer (the
+    default) or pickle, which lets every process able to write to the
+    directory run code in all bridges. The directory must be owned by
+    the current user and not be accessible by others, otherwise a
+    PermissionError is raised. Events which can't be serialized or are
+    larger than MAX_DATAGRAM are logged and dropped, just like batches
+    for peers whose socket buffer stays full for timeout seconds.
+
+    Received events are triggered by a background thread, so the
+    Observable should be a ThreadSafeObservable unless handlers are
+    only registered before the bridge is created. Events received from
+    other bridges aren't forwarded again, but events triggered by their
+    handlers are. Create bridges after forking and close them on
+    shutdown.
+    """
+
+    def __init__(
+            self, observable: Observable, directory: str, events: T.Iterable[str],
+            serializer: T.Any = JSONSerializer, linger: float = 0.0,
+            rescan: float = 1.0,
+            timeout: float = 1.0
+    ) -> None:
+        self.observable = observable
+        self.directory = directory
+        self.serializer = serializer
+        self.linger = linger
+        self.rescan = rescan
+        #: number of events which couldn't be delivered to a peer
+        self.dropped = 0
+
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        status = os.stat(directory)
+        if status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise PermissionError(
+                "{} must be owned by the current user and not be accessible "
+                "by others".format(directory))
+        self.path = os.path.join(directory, "{}-{}{}".format(
+            os.getpid(), next(_COUNTER), _SUFFIX))
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._sender_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender_socket.settimeout(timeout)
+        self._peers = set()  # type: T.Set[str]
+        self._scanned = 0.0
+
+        self._pending = []  # type: T.List[T.Tuple[str, tuple, dict]]
+        #: the received trigger the receiver thread is dispatching
+        self._local = threading.local()
+        self._sending = False
+        self._closed = False
+        self._mutex = threading.Lock()
+        self._wakeup = threading.Condition(self._mutex)
+        self._idle = threading.Condition(self._mutex)
+        self._receiver = threading.Thread(
+            target=self._receive, name="SocketBridge-receiver", daemon=True)
+        self._sender = threading.Thread(
+            target=self._send, name="SocketBridge-sender", daemon=True)
+        self._receiver.start()
+        self._sender.start()
+
+        hello = _HELLO + self.path.encode("utf-8")
+        for peer in self._current_peers():
+            self._sendto(hello, peer)
+
+        self._handlers = []  # type: T.List[T.Tuple[str, T.Callable]]
+        for event in events:
+            if is_pattern(event):
+                handler = self._forward  # type: T.Callable
+            else:
+                handler = functools.partial(self._forward, event)
+            observable.on(event, handler)
+            self._handlers.append((event, handler))
+
+    def __enter__(self) -> "SocketBridge":
+        return self
+
+    def __exit__(self, *exc_info: T.Any) -> None:
+        self.close()
+
+    @property
+    def peers(self) -> T.List[str]:
+        """The socket paths of the currently known peers."""
+
+        return sorted(self._peers)
+
+    def _forward(self, event: str, *args: T.Any, **kw: T.Any) -> None:
+        """Handler queueing a trigger to be sent to the peers, unless it
+        is the received trigger being dispatched."""
+
+        received = getattr(self._local, "received", None)
+        if received is not None and _same_trigger(received, (event, args, kw)):
+            return
+        with self._mutex:
+            if self._closed:
+                return
+            self._pending.append((event, args, kw))
+            if len(self._pending) == 1:
+                self._wakeup.notify()
+
+    def _send(self) -> None:
+        """Sends batches of queued triggers until the bridge is closed."""
+
+        while True:
+            with self._mutex:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                self._sending = True
+            if self.linger:
+                time.sleep(self.linger)
+            with self._mutex:
+                batch, self._pending = self._pending, []
+            try:
+                self._publish(batch)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Sending %d events failed", len(batch))
+            finally:
+                with self._mutex:
+                    self._sending = False
+                    self._idle.notify_all()
+
+    def _publish(self, batch: T.List[T.Tuple[str, tuple, dict]]) -> None:
+        """Sends a batch of triggers to all peers."""
+
+        datagrams = self._encode(batch)
+        if not datagrams:
+            return
+        for peer in self._current_peers():
+            for count, datagram in datagrams:
+                if not self._sendto(datagram, peer):
+                    self.dropped += count
+
+    def _encode(
+            self, batch: T.List[T.Tuple[str, tuple, dict]]
+    ) -> T.List[T.Tuple[int, bytes]]:
+        """Encodes a batch of triggers as one or more datagrams, paired
+        with the number of triggers they contain. Triggers which can't
+        be serialized or don't fit into a datagram are dropped."""
+
+        try:
+            datagram = _EVENTS + self.serializer.dumps(batch)
+        except Exception:  # pylint: disable=broad-except
+            if len(batch) == 1:
+                _LOGGER.exception("Can't serialize event %s", batch[0][0])
+                self.dropped += 1
+                return []
+        else:
+            if len(datagram) <= MAX_DATAGRAM:
+                return [(len(batch), datagram)]
+            if len(batch) == 1:
+                _LOGGER.error(
+                    "Event %s is too large to be sent (%d bytes)",
+                    batch[0][0], len(datagram))
+                self.dropped += 1
+                return []
+        middle = len(batch) // 2
+        return self._encode(batch[:middle]) + self._encode(batch[middle:])
+
+    def _sendto(self, datagram: bytes, peer: str) -> bool:
+        """Sends a datagram to a peer and returns whether that worked.
+        Forgets peers which are gone."""
+
+        try:
+            self._sender_socket.sendto(datagram, peer)
+        except (BlockingIOError, socket.timeout):
+            return False
+        except ConnectionRefusedError:
+            # a socket nobody listens on anymore, left by a crashed process
+            self._peers.discard(peer)
+            try:
+                os.unlink(peer)
+            except OSError:
+                pass
+            return False
+        except FileNotFoundError:
+            self._peers.discard(peer)
+            return False
+        return True
+
+    def _current_peers(self) -> T.List[str]:
+        """Returns the known peers, looking for new ones in the directory
+        every rescan seconds."""
+
+        if time.monotonic() - self._scanned >= self.rescan:
+            self._scanned = time.monotonic()
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                names = []
+            self._peers = {
+                os.path.join(self.directory, name) for name in names
+                if name.endswith(_SUFFIX)
+            } - {self.path}
+        return list(self._peers)
+
+    def _receive(self) -> None:
+        """Triggers the events received from peers until the bridge
+        sends a bye to itself."""
+
+        buffer = bytearray(MAX_DATAGRAM)
+        while True:
+            size = self._socket.recv_into(buffer)
+            kind, data = bytes(buffer[:1]), bytes(buffer[1:size])
+            if kind not in (_HELLO, _BYE, _EVENTS):
+                _LOGGER.error("Received a datagram of unknown kind %r", kind)
+                continue
+            try:
+                if kind == _EVENTS:
+                    batch = self._decode(data)
+                else:
+                    peer = self._peer(data)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Can't decode a received datagram")
+                continue
+            if kind == _HELLO:
+                self._peers.add(peer)
+            elif kind == _BYE:
+                if peer == self.path:
+                    return
+                self._peers.discard(peer)
+            else:
+                for event, args, kw in batch:
+                    self._local.received = (event, args, kw)
+                    try:
+                        Observable.trigger(self.observable, event, *args, **kw)
+                    except Exception:  # pylint: disable=broad-except
+                        _LOGGER.exception("Dispatching event %s failed", event)
+                    finally:
+                        self._local.received = None
+
+    def _decode(self, data: bytes) -> T.List[T.Tuple[str, T.Sequence, dict]]:
+        """Deserializes a batch of triggers and checks its shape.
+        Raises ValueError for malformed batches."""
+
+        batch = []  # type: T.List[T.Tuple[str, T.Sequence, dict]]
+        for trigger in self.serializer.loads(data):
+            event, args, kw = trigger
+            if not (isinstance(event, str) and isinstance(args, (list, tuple))
+                    and isinstance(kw, dict)):
+                raise ValueError("Malformed trigger {!r}".format(trigger))
+            batch.append((event, args, kw))
+        return batch
+
+    def _peer(self, data: bytes) -> str:
+        """Decodes the socket path of a peer sent with a hello or bye.
+        Raises ValueError for paths which aren't sockets of bridges in
+        the directory, so peers can't make the bridge send events to
+        other sockets."""
+
+        peer = data.decode("utf-8")
+        if (os.path.dirname(peer) != os.path.dirname(self.path)
+                or not os.path.basename(peer).endswith(_SUFFIX)):
+            raise ValueError("{!r} isn't a socket of a bridge".format(peer))
+        return peer
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until all queued triggers were sent. Returns False when
+        that didn't happen within timeout seconds."""
+
+        with self._mutex:
+            return self._idle.wait_for(
+                lambda: not self._pending and not self._sending, timeout)
+
+    def close(self) -> None:
+        """Sends the queued triggers, stops forwarding and receiving
+        events and removes the socket."""
+
+        with self._mutex:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._sender.join()
+
+        for event, handler in self._handlers:
+            try:
+                self.observable.off(event, handler)
+            except (EventNotFound, HandlerNotFound):
+                pass
+        bye = _BYE + self.path.encode("utf-8")
+        for peer in list(self._peers):
+            self._sendto(bye, peer)
+        self._sender_socket.setblocking(True)
+        self._sender_socket.sendto(bye, self.path)
+        self._receiver.join()
+        self._socket.close()
+        self._sender_socket.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,361 @@
+import asyncio
+
+import pytest
+
+from observable import DispatchError, StopPropagation
+from observable.aio import AsyncObservable
+from observable.property import ObservableProperty
+from observable.stats import DispatchHook, Instrumentation
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def _recording_handlers(obs, results, *names):
+    for name in names:
+        @obs.on("some_event")
+        async def handler(value, name=name):
+            results.append((name, "start", value))
+            await asyncio.sleep(0)
+            results.append((name, "end", value))
+
+
+def test_gather():
+    """test coroutine handlers run concurrently in gather mode"""
+    obs = AsyncObservable()
+    results = []
+    _recording_handlers(obs, results, "a", "b")
+
+    @obs.on("some_event")
+    def sync_handler(value):
+        results.append(("sync", value))
+
+    assert _run(obs.trigger("some_event", 1))
+    assert results == [
+        ("sync", 1),
+        ("a", "start", 1),
+        ("b", "start", 1),
+        ("a", "end", 1),
+        ("b", "end", 1),
+    ]
+    assert not _run(obs.trigger("other_event"))
+
+
+def test_sequential():
+    """test coroutine handlers are awaited in order in sequential mode"""
+    obs = AsyncObservable(mode="sequential")
+    results = []
+    _recording_handlers(obs, results, "a", "b")
+
+    assert _run(obs.trigger("some_event", 1))
+    assert results == [
+        ("a", "start", 1),
+        ("a", "end", 1),
+        ("b", "start", 1),
+        ("b", "end", 1),
+    ]
+
+
+def test_background():
+    """test trigger doesn't wait for coroutine handlers in background mode"""
+    obs = AsyncObservable(mode="background")
+    results = []
+    _recording_handlers(obs, results, "a")
+
+    async def main():
+        assert await obs.trigger("some_event", 1)
+        assert results == []
+        await obs.drain()
+
+    _run(main())
+    assert results == [("a", "start", 1), ("a", "end", 1)]
+
+
+@pytest.mark.parametrize("mode", AsyncObservable.MODES)
+def test_concurrency(mode):
+    """test the number of concurrently running handlers is bounded"""
+    obs = AsyncObservable(mode=mode, concurrency=2)
+    running = 0
+    peak = 0
+
+    async def handler():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+
+    async def main():
+        for _ in range(3):
+            await obs.trigger("some_event")
+        await obs.drain()
+
+    obs.on("some_event", *[handler] * 3)
+    _run(main())
+    assert peak == (1 if mode == "sequential" else 2)
+
+
+def test_concurrency_loops():
+    """test the concurrency limit works with several event loops"""
+    obs = AsyncObservable(concurrency=1)
+    results = []
+
+    async def handler(value):
+        await asyncio.sleep(0)
+        results.append(value)
+
+    obs.on("some_event", handler, handler)
+    for value in range(2):
+        assert _run(obs.trigger("some_event", value))
+    assert results == [0, 0, 1, 1]
+
+
+def test_once_and_off():
+    """test once and off work with coroutine handlers"""
+    obs = AsyncObservable()
+    results = []
+
+    @obs.once("some_event")
+    async def once_handler(value):
+        results.append(("once", value))
+
+    async def on_handler(value):
+        results.append(("on", value))
+
+    obs.on("some_event", on_handler)
+    obs.once("some_event", on_handler, on_handler)
+
+    async def main():
+        await obs.trigger("some_event", 1)
+        await obs.trigger("some_event", 2)
+        obs.off("some_event", on_handler)
+        assert not await obs.trigger("some_event", 3)
+
+    _run(main())
+    assert results == [("once", 1), ("on", 1), ("on", 1), ("on", 1), ("on", 2)]
+
+
+@pytest.mark.parametrize("mode", ["gather", "sequential"])
+def test_stop_propagation(mode):
+    """test handlers raising StopPropagation skip the remaining ones"""
+    obs = AsyncObservable(mode=mode)
+    results = []
+
+    @obs.on("some_event")
+    def sync_handler(value):
+        results.append("sync")
+        if value > 1:
+            raise StopPropagation()
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        results.append("async")
+        raise StopPropagation()
+
+    obs.on("some_event", lambda value: results.append("other"))
+
+    assert _run(obs.trigger("some_event", 2))
+    assert results == ["sync"]
+    results.clear()
+    assert _run(obs.trigger("some_event", 1))
+    if mode == "sequential":
+        assert results == ["sync", "async"]
+    else:
+        assert results == ["sync", "other", "async"]
+
+
+@pytest.mark.parametrize("mode", ["gather", "sequential"])
+def test_errors_collect(mode):
+    """test failures of handlers and coroutines are collected"""
+    obs = AsyncObservable(mode=mode, errors="collect")
+    results = []
+
+    @obs.on("some_event")
+    def sync_handler(value):
+        raise ValueError("sync")
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        raise ValueError("async")
+
+    obs.on("some_event", lambda value: results.append(value))
+
+    with pytest.raises(DispatchError) as error:
+        _run(obs.trigger("some_event", 1))
+    assert results == [1]
+    assert [str(exc) for exc in error.value.exceptions] == ["sync", "async"]
+
+
+def test_errors_event():
+    """test failures are routed to the error event, awaiting its handlers"""
+    obs = AsyncObservable(mode="background", errors="event")
+    results = []
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        raise ValueError(value)
+
+    @obs.on("error")
+    async def error_handler(event, handler, exc):
+        results.append((event, handler, str(exc)))
+
+    async def main():
+        await obs.trigger("some_event", "failed")
+        await obs.drain()
+
+    _run(main())
+    assert results == [("some_event", async_handler, "failed")]
+
+
+def test_errors_raise_background(caplog):
+    """test failures of background tasks are logged when errors is raise"""
+    obs = AsyncObservable(mode="background")
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        raise ValueError(value)
+
+    async def main():
+        await obs.trigger("some_event", "failed")
+        await obs.drain()
+
+    _run(main())
+    assert [
+        (record.name, record.exc_info[1].args) for record in caplog.records
+    ] == [("observable.aio", ("failed",))]
+
+
+def test_property():
+    """test ObservableProperty triggers its events in background tasks and
+    needs a running loop to do so"""
+
+    class Model(AsyncObservable):
+        __slots__ = ("value",)
+
+        @ObservableProperty
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    obs = Model()
+    obs.prop = 0
+    results = []
+
+    @obs.on("after_set_prop")
+    async def handler(value):
+        await asyncio.sleep(0)
+        results.append(value)
+
+    async def main():
+        obs.prop = 1
+        await obs.drain()
+
+    _run(main())
+    assert results == [1]
+    with pytest.raises(RuntimeError):
+        obs.prop = 2
+
+
+def test_errors_event_flush(caplog):
+    """test failures of deferred calls delivered by flush trigger the
+    error event in a running loop and are logged otherwise"""
+    obs = AsyncObservable(errors="event")
+    results = []
+
+    @obs.on("some_event", coalesce=True)
+    def failing(value):
+        raise ValueError(value)
+
+    @obs.on("error")
+    async def error_handler(event, handler, exc):
+        results.append((event, handler, str(exc)))
+
+    async def main():
+        await obs.trigger("some_event", "failed")
+        assert obs.flush() == 1
+        await obs.drain()
+
+    _run(main())
+    assert results == [("some_event", failing, "failed")]
+
+    _run(obs.trigger("some_event", "logged"))
+    assert obs.flush() == 1
+    assert [
+        (record.name, record.exc_info[1].args) for record in caplog.records
+    ] == [("observable.aio", ("logged",))]
+
+
+def test_instrumentation_and_hooks():
+    """test instrumentation and hooks record calls until coroutines are done
+    and batch is rejected"""
+    obs = AsyncObservable()
+    calls = []
+
+    class Hook(DispatchHook):
+        def after(self, event, handler, args, kw, seconds, exception):
+            calls.append((event, args, type(exception)))
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        await asyncio.sleep(0)
+        calls.append("awaited")
+        if value < 0:
+            raise ValueError(value)
+
+    obs.instrumentation = instrumentation = Instrumentation()
+    obs.add_hook(Hook())
+    _run(obs.trigger("some_event", 1))
+    with pytest.raises(ValueError):
+        _run(obs.trigger("some_event", -1))
+
+    assert calls == [
+        "awaited", ("some_event", (1,), type(None)),
+        "awaited", ("some_event", (-1,), ValueError),
+    ]
+    stats = instrumentation.stats()["some_event"]
+    assert stats["triggers"] == 2
+    (handler_stats,) = stats["handlers"].values()
+    assert (handler_stats["calls"], handler_stats["errors"]) == (2, 1)
+
+    with pytest.raises(TypeError):
+        obs.batch()
+
+
+def test_sync_dispatch_rejected():
+    """test methods calling handlers synchronously are rejected instead of
+    dropping the coroutines of the handlers"""
+    obs = AsyncObservable()
+    calls = []
+
+    @obs.on("some_event")
+    async def async_handler(value):
+        calls.append(value)
+
+    for dispatch in (
+            lambda: obs.trigger_many("some_event", [(1,)]),
+            lambda: list(obs.results("some_event", 1)),
+            lambda: obs.reduce("some_event", max, 0, 1),
+            lambda: obs.submit("some_event", 1),
+            lambda: obs.dispatcher("some_event"),
+    ):
+        with pytest.raises(TypeError):
+            dispatch()
+    assert calls == []
+
+
+def test_invalid_arguments():
+    """test invalid modes and concurrency limits are rejected"""
+    with pytest.raises(ValueError):
+        AsyncObservable(mode="parallel")
+    with pytest.raises(ValueError):
+        AsyncObservable(concurrency=0)
+    with pytest.raises(ValueError):
+        AsyncObservable(errors="ignore")
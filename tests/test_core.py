@@ -1,8 +1,25 @@
+import asyncio
+import copy
+import gc
+import operator
+import pickle
 import threading
+import weakref
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 
 import pytest
 
-from observable import Observable, EventNotFound, HandlerNotFound
+from observable import (
+    Observable,
+    ThreadSafeObservable,
+    WeakObservable,
+    DispatchError,
+    EventNotFound,
+    HandlerNotFound,
+    StopPropagation,
+)
+from observable.stats import DispatchHook
 
 
 def test_on_decorator():
@@ -13,7 +30,7 @@ def test_on_decorator():
     def on_test():
         pass
 
-    assert on_test in obs._events["on_test"]
+    assert on_test in obs.get_handlers("on_test")
 
 
 def test_on():
@@ -24,7 +41,7 @@ def test_on():
         pass
 
     obs.on("on_test", on_test)
-    assert on_test in obs._events["on_test"]
+    assert on_test in obs.get_handlers("on_test")
 
 
 def test_once_decorator():
@@ -35,9 +52,9 @@ def test_once_decorator():
     def once_test():
         pass
 
-    assert once_test in obs._events["once_test"]
+    assert once_test in obs.get_handlers("once_test")
     assert obs.trigger("once_test")
-    assert once_test not in obs._events["once_test"]
+    assert once_test not in obs.get_handlers("once_test")
 
 
 def test_once():
@@ -49,9 +66,29 @@ def test_once():
 
     obs.once("once_test", once_test)
 
-    assert len(obs._events["once_test"]) == 1
+    assert len(obs.get_handlers("once_test")) == 1
     assert obs.trigger("once_test")
-    assert obs._events["once_test"] == []
+    assert obs.get_handlers("once_test") == []
+
+
+def test_once_multiple():
+    """test once wraps all handlers of a call in one wrapper, which
+    unregisters all of them"""
+    obs = Observable()
+    results = []
+
+    wrapper = obs.once(
+        "once_test", results.append, lambda value: results.append(-value)
+    )
+    assert obs.get_handlers("once_test") == [wrapper]
+    assert obs.trigger("once_test", 1)
+    assert not obs.trigger("once_test", 2)
+    assert results == [1, -1]
+
+    wrapper = obs.once("once_test", results.append, results.append)
+    obs.off("once_test", wrapper)
+    assert not obs.trigger("once_test", 3)
+    assert results == [1, -1]
 
 
 def test_on_trigger():
@@ -65,7 +102,7 @@ def test_on_trigger():
     def on_test(obj):
         obj.called = True
 
-    assert obs._events == {"on_test": [on_test]}
+    assert obs.get_all_handlers() == {"on_test": [on_test]}
     assert obs.trigger("on_test", obj)
     assert obj.called
 
@@ -81,11 +118,11 @@ def test_once_trigger():
     def once_test(obj):
         obj.called = True
 
-    assert len(obs._events["once_test"]) == 1
-    assert obs._events["once_test"] == [once_test]
+    assert len(obs.get_handlers("once_test")) == 1
+    assert obs.get_handlers("once_test") == [once_test]
     assert obs.trigger("once_test", obj)
     assert obj.called
-    assert obs._events["once_test"] == []
+    assert obs.get_handlers("once_test") == []
     assert not obs.trigger("once_test", obj)
 
 
@@ -107,16 +144,16 @@ def test_off():
     def on_test():
         pass
 
-    assert obs._events["on_test"] == [on_test]
+    assert obs.get_handlers("on_test") == [on_test]
     assert obs.trigger("on_test")
 
     obs.off("on_test", on_test)
 
-    assert obs._events["on_test"] == []
+    assert obs.get_handlers("on_test") == []
 
     obs.off()
 
-    assert not obs._events
+    assert not obs.get_all_handlers()
 
     @obs.on("more_than_one_event")
     def func1():
@@ -130,11 +167,11 @@ def test_off():
     def func3():
         pass
 
-    assert obs._events["more_than_one_event"] == [func1, func2, func3]
+    assert obs.get_handlers("more_than_one_event") == [func1, func2, func3]
     obs.off("more_than_one_event", func2)
-    assert obs._events["more_than_one_event"] == [func1, func3]
+    assert obs.get_handlers("more_than_one_event") == [func1, func3]
     obs.off("more_than_one_event")
-    assert obs._events["more_than_one_event"] == []
+    assert obs.get_handlers("more_than_one_event") == []
 
 
 def test_off_exceptions():
@@ -151,8 +188,8 @@ def test_off_exceptions():
     def some_non_assigned_handler():
         pass
 
-    assert some_assigned_handler in obs._events["some_event"]
-    assert some_non_assigned_handler not in obs._events["some_event"]
+    assert some_assigned_handler in obs.get_handlers("some_event")
+    assert some_non_assigned_handler not in obs.get_handlers("some_event")
 
     with pytest.raises(HandlerNotFound):
         obs.off("some_event", some_non_assigned_handler)
@@ -206,7 +243,7 @@ def test_on_multiple_handlers():
         results.append(2)
 
     obs.on("some_test", some_test, some_test_2)
-    assert len(obs._events["some_test"]) == 2
+    assert len(obs.get_handlers("some_test")) == 2
 
     obs.trigger("some_test")
     assert results == [1, 2]
@@ -225,10 +262,10 @@ def test_off_multiple_handlers():
         results.append(2)
 
     obs.on("some_test", some_test, some_test_2)
-    assert len(obs._events["some_test"]) == 2
+    assert len(obs.get_handlers("some_test")) == 2
 
     obs.off("some_test", some_test, some_test_2)
-    assert len(obs._events["some_test"]) == 0
+    assert len(obs.get_handlers("some_test")) == 0
     assert not obs.trigger("some_test")
 
 
@@ -306,3 +343,1248 @@ def test_is_registered():
     assert not obs.is_registered("some_event", some_test)
     obs.on("some_event", some_test)
     assert obs.is_registered("some_event", some_test)
+
+
+def test_trigger_snapshot():
+    """test handlers added or removed during dispatch don't affect the
+    currently running trigger"""
+    obs = Observable()
+
+    results = []
+
+    def late_handler():
+        results.append("late")
+
+    @obs.on("some_event")
+    def first_handler():
+        results.append("first")
+        obs.on("some_event", late_handler)
+        obs.off("some_event", second_handler)
+
+    @obs.on("some_event")
+    def second_handler():
+        results.append("second")
+
+    assert obs.trigger("some_event")
+    assert results == ["first", "second"]
+    assert obs.get_handlers("some_event") == [first_handler, late_handler]
+
+
+def test_dispatcher():
+    """test calling the compiled dispatcher of events with different
+    numbers of handlers"""
+    obs = Observable()
+
+    results = []
+
+    assert obs.dispatcher("some_event")(1) is None
+
+    for index in range(5):
+        obs.on("some_event", lambda value, index=index: results.append(
+            (index, value)))
+        results.clear()
+        obs.dispatcher("some_event")(42)
+        assert results == [(i, 42) for i in range(index + 1)]
+
+    dispatch = obs.dispatcher("some_event")
+    obs.off("some_event")
+    assert obs.dispatcher("some_event") is not dispatch
+    results.clear()
+    obs.dispatcher("some_event")(42)
+    assert results == []
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5])
+def test_dispatcher_stop_propagation(count):
+    """test compiled dispatchers skip the remaining handlers when a handler
+    raises StopPropagation, which only reaches the caller from a lone
+    handler"""
+    obs = Observable()
+    results = []
+
+    @obs.on("some_event")
+    def stop(value):
+        results.append(value)
+        raise StopPropagation()
+
+    for _ in range(count - 1):
+        obs.on("some_event", lambda value: results.append("other"))
+
+    dispatch = obs.dispatcher("some_event")
+    if count == 1:
+        assert dispatch is stop
+        with pytest.raises(StopPropagation):
+            dispatch(1)
+    else:
+        dispatch(1)
+    assert obs.trigger("some_event", 2)
+    assert results == [1, 2]
+
+
+def test_duplicate_handlers():
+    """test registering the same handler multiple times keeps the
+    registration order and off removes all of its registrations"""
+    obs = Observable()
+
+    results = []
+
+    def some_test():
+        results.append(1)
+
+    def other_test():
+        results.append(2)
+
+    obs.on("some_event", some_test, other_test, some_test)
+    assert obs.get_handlers("some_event") == [some_test, other_test, some_test]
+
+    obs.trigger("some_event")
+    assert results == [1, 2, 1]
+
+    obs.off("some_event", some_test)
+    assert not obs.is_registered("some_event", some_test)
+    assert obs.get_handlers("some_event") == [other_test]
+
+    with pytest.raises(HandlerNotFound):
+        obs.off("some_event", some_test)
+
+
+@pytest.mark.parametrize("options", [{}, {"weak": True}, {"debounce": 0.0}])
+def test_unhashable_handlers(options):
+    """test handlers which aren't hashable are registered and found by
+    identity"""
+    obs = Observable()
+    obs.clock = _FakeClock()
+    results = []
+
+    class Handler:
+        def __init__(self, name):
+            self.name = name
+
+        def __eq__(self, other):
+            return isinstance(other, Handler)
+
+        def __call__(self):
+            results.append(self.name)
+
+    first, second = Handler("first"), Handler("second")
+    obs.on("some_event", first, second, **options)
+    obs.on("some_event", first, priority=1, **options)
+    assert obs.is_registered("some_event", second)
+    assert not obs.is_registered("some_event", Handler("other"))
+
+    obs.trigger("some_event")
+    obs.flush()
+    obs.off("some_event", first)
+    obs.trigger("some_event")
+    obs.flush()
+    assert results == ["first", "first", "second", "second"]
+    with pytest.raises(HandlerNotFound):
+        obs.off("some_event", first)
+
+
+def test_on_weak():
+    """test weakly registered handlers don't keep their objects alive and
+    are pruned on the next trigger"""
+    obs = Observable()
+
+    results = []
+
+    class Listener:
+        def handle(self, value):
+            results.append(value)
+
+    listener = Listener()
+    listener_ref = weakref.ref(listener)
+
+    obs.on("some_event", listener.handle, weak=True)
+    assert obs.is_registered("some_event", listener.handle)
+    assert obs.trigger("some_event", 1)
+    assert results == [1]
+
+    del listener
+    gc.collect()
+    assert listener_ref() is None
+
+    assert obs.trigger("some_event", 2)
+    assert results == [1]
+    assert obs.get_handlers("some_event") == []
+    assert not obs.trigger("some_event", 3)
+
+
+def test_off_weak():
+    """test unregistering a weakly registered bound method"""
+    obs = Observable()
+
+    class Listener:
+        def handle(self):
+            pass
+
+    listener = Listener()
+    obs.on("some_event", listener.handle, weak=True)
+    obs.off("some_event", listener.handle)
+    assert not obs.is_registered("some_event", listener.handle)
+
+
+def test_on_weak_builtin_method():
+    """test methods implemented in C don't keep their object alive when
+    registered weakly, or raise TypeError if it can't be"""
+    obs = WeakObservable()
+
+    class Items(list):
+        pass
+
+    items = Items()
+    items_ref = weakref.ref(items)
+    obs.on("some_event", items.append)
+    gc.collect()
+    assert obs.is_registered("some_event", items.append)
+    assert obs.trigger("some_event", 1)
+    assert items == [1]
+
+    obs.off("some_event", items.append)
+    assert not obs.trigger("some_event", 2)
+    obs.on("some_event", items.append)
+    del items
+    gc.collect()
+    assert items_ref() is None
+    assert obs.trigger("some_event", 3)
+    assert obs.get_handlers("some_event") == []
+
+    with pytest.raises(TypeError):
+        obs.on("some_event", [].append)
+
+
+def test_on_weak_type_error():
+    """test a handler which can't be referenced weakly registers none of
+    the handlers passed with it"""
+    obs = WeakObservable()
+    results = []
+
+    def some_test():
+        results.append(1)
+
+    obs.on("some_event", some_test)
+    assert obs.trigger("some_event")
+    with pytest.raises(TypeError):
+        obs.on("some_event", some_test, [].append)
+    assert obs.get_handlers("some_event") == [some_test]
+    assert obs.trigger("some_event")
+    assert results == [1, 1]
+    with pytest.raises(TypeError):
+        obs.on("other_event", [].append)
+    assert "other_event" not in obs.get_all_handlers()
+
+
+def test_strong_handlers_dispatch_directly():
+    """test that weak handler support doesn't wrap strong handlers"""
+    obs = Observable()
+
+    def some_test():
+        pass
+
+    obs.on("some_event", some_test)
+    assert obs._compile("some_event") is some_test
+
+
+def test_weak_observable():
+    """test WeakObservable registers handlers weakly by default"""
+    obs = WeakObservable()
+
+    results = []
+
+    def some_test():
+        results.append("on")
+
+    obs.on("some_event", some_test)
+    obs.once("some_event", lambda: results.append("once"))
+    obs.on("some_event", lambda: results.append("strong"), weak=False)
+    gc.collect()
+
+    assert obs.trigger("some_event")
+    assert obs.trigger("some_event")
+    assert results == ["on", "strong", "on", "strong"]
+
+
+def test_on_executor():
+    """test handlers registered with an executor don't block trigger"""
+    obs = Observable()
+    release = threading.Event()
+
+    def blocking_handler():
+        return release.wait(5)
+
+    results = []
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        obs.on("some_event", blocking_handler, executor=executor)
+        obs.on("some_event", lambda: results.append("inline"))
+        assert obs.is_registered("some_event", blocking_handler)
+
+        futures = obs.submit("some_event")
+        assert results == ["inline"]
+        assert not futures[0].done()
+        assert futures[1].done()
+
+        release.set()
+        wait(futures)
+        assert futures[0].result() is True
+
+    obs.off("some_event", blocking_handler)
+    assert len(obs.get_handlers("some_event")) == 1
+
+
+def test_submit_exception():
+    """test exceptions of inline handlers are set on their futures"""
+    obs = Observable()
+
+    @obs.on("some_event")
+    def failing_handler():
+        raise ValueError("failed")
+
+    future, = obs.submit("some_event")
+    assert isinstance(future.exception(), ValueError)
+
+
+def _square(value):
+    return value * value
+
+
+def test_observable_executor():
+    """test all handlers are submitted to the executor of an observable"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        obs = Observable(executor=executor)
+        obs.on("some_event", _square)
+        assert obs.trigger("some_event", 3)
+        future, = obs.submit("some_event", 4)
+        assert future.result(timeout=30) == 16
+
+    obs.executor = None
+    future, = obs.submit("some_event", 5)
+    assert future.done()
+    assert future.result() == 25
+
+
+def test_thread_safe_observable():
+    """test registering and unregistering handlers from multiple threads
+    while other threads trigger the event never skips a handler"""
+    obs = ThreadSafeObservable()
+    calls = []
+    errors = []
+    done = threading.Event()
+
+    obs.on("some_event", lambda: calls.append(None))
+
+    def churn():
+        try:
+            while not done.is_set():
+                handlers = [lambda: None for _ in range(10)]
+                obs.on("some_event", *handlers)
+                obs.off("some_event", *handlers)
+        except Exception as exc:  # pragma: no cover
+            errors.append(exc)
+
+    def trigger():
+        try:
+            for _ in range(2000):
+                obs.trigger("some_event")
+        except Exception as exc:  # pragma: no cover
+            errors.append(exc)
+
+    writers = [threading.Thread(target=churn) for _ in range(4)]
+    readers = [threading.Thread(target=trigger) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    done.set()
+    for thread in writers:
+        thread.join()
+
+    assert not errors
+    assert len(calls) == 4 * 2000
+    assert len(obs.get_handlers("some_event")) == 1
+
+
+class _CountingLock:
+    """Reentrant lock counting how often it was taken."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.count = 0
+
+    def __enter__(self):
+        self.count += 1
+        self.lock.acquire()
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def test_thread_safe_observable_unhandled():
+    """test triggering events without handlers, including events whose
+    handlers were all removed, doesn't take the lock"""
+    obs = ThreadSafeObservable()
+
+    def handler():
+        pass
+
+    obs.on("some_event", handler)
+    obs.trigger("some_event")
+    obs.off("some_event", handler)
+    obs._lock = lock = _CountingLock()
+    assert obs.trigger("some_event") is False
+    lock.count = 0
+
+    for _ in range(100):
+        assert obs.trigger("some_event") is False
+        assert obs.trigger("other_event") is False
+    assert list(obs.results("some_event")) == []
+    assert lock.count == 0
+
+
+def test_trigger_many():
+    """test trigger_many calls ordinary handlers once per item and batch
+    handlers once with all items"""
+    obs = Observable()
+
+    results = []
+
+    @obs.on("some_event")
+    def some_test(key, value, scale=1):
+        results.append((key, value * scale))
+
+    @obs.on("some_event", batch=True)
+    def batch_test(items, scale=1):
+        results.append(("batch", items, scale))
+
+    @obs.once("some_event")
+    def once_test(key, value, scale=1):
+        results.append(("once", key))
+
+    items = ((key, value) for key, value in [("a", 1), ("b", 2)])
+    assert obs.trigger_many("some_event", items, scale=10)
+    assert results == [
+        ("a", 10),
+        ("b", 20),
+        ("batch", [("a", 1), ("b", 2)], 10),
+        ("once", "a"),
+    ]
+
+    results.clear()
+    assert obs.trigger("some_event", "c", 3)
+    assert results == [("c", 3), ("batch", [("c", 3)], 1)]
+
+    assert obs.is_registered("some_event", batch_test)
+    assert not obs.trigger_many("other_event", [(1,)])
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_on_debounce():
+    """test debounced handlers are only called with the latest arguments
+    once the event wasn't triggered for a while"""
+    obs = Observable()
+    obs.clock = clock = _FakeClock()
+    results = []
+
+    obs.on("some_event", results.append, debounce=1.0)
+
+    obs.trigger("some_event", 1)
+    clock.now = 0.5
+    obs.trigger("some_event", 2)
+    clock.now = 1.0
+    assert obs.flush() == 0
+    clock.now = 1.5
+    assert obs.flush() == 1
+    assert results == [2]
+    assert obs.flush(force=True) == 0
+
+
+def test_on_throttle():
+    """test throttled handlers are called at most once per interval with
+    the latest arguments at the end of each interval"""
+    obs = Observable()
+    obs.clock = clock = _FakeClock()
+    results = []
+
+    obs.on("some_event", results.append, throttle=1.0)
+
+    obs.trigger("some_event", 1)
+    obs.trigger("some_event", 2)
+    obs.trigger("some_event", 3)
+    assert results == [1]
+    clock.now = 0.5
+    assert obs.flush() == 0
+    clock.now = 1.0
+    assert obs.flush() == 1
+    assert results == [1, 3]
+    clock.now = 1.5
+    obs.trigger("some_event", 4)
+    assert results == [1, 3]
+    clock.now = 3.0
+    obs.trigger("some_event", 5)
+    assert obs.flush() == 1
+    assert results == [1, 3, 5]
+
+
+def test_on_coalesce():
+    """test coalesced handlers are called with the latest arguments on
+    flush"""
+    obs = Observable()
+    results = []
+
+    obs.on("some_event", results.append, coalesce=True)
+    obs.on("other_event", results.append, coalesce=True)
+
+    for value in range(5):
+        obs.trigger("some_event", value)
+    obs.trigger("other_event", "other")
+    assert results == []
+    assert obs.flush() == 2
+    assert results == [4, "other"]
+    assert obs.is_registered("some_event", results.append)
+
+    with pytest.raises(ValueError):
+        obs.on("some_event", results.append, coalesce=True, debounce=1.0)
+
+
+def test_on_debounce_loop():
+    """test deferred handler calls are delivered by an asyncio loop"""
+    loop = asyncio.new_event_loop()
+    obs = Observable()
+    obs.loop = loop
+    results = []
+
+    obs.on("some_event", results.append, debounce=0.01)
+
+    async def main():
+        for value in range(3):
+            obs.trigger("some_event", value)
+            await asyncio.sleep(0)
+        assert results == []
+        await asyncio.sleep(0.05)
+
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    assert results == [2]
+
+
+@pytest.mark.parametrize("scope, expected", [
+    ("handler", [1]), ("event", []), ("all", []),
+])
+def test_off_deferred(scope, expected):
+    """test unregistering deferred handlers drops their pending calls"""
+    obs = Observable()
+    results = []
+
+    def batched(items):
+        results.extend(items)
+
+    obs.on("some_event", results.append, debounce=1.0)
+    obs.on("some_event", batched, batch=True, coalesce=True)
+    obs.trigger("some_event", 1)
+
+    if scope == "handler":
+        obs.off("some_event", batched)
+    elif scope == "event":
+        obs.off("some_event")
+    else:
+        obs.off()
+    assert obs.flush(force=True) == len(expected)
+    assert results == expected
+
+
+def test_off_deferred_loop():
+    """test unregistering deferred handlers cancels their scheduled calls"""
+    loop = asyncio.new_event_loop()
+    obs = Observable()
+    obs.loop = loop
+    results = []
+
+    obs.on("some_event", results.append, debounce=0.01)
+
+    async def main():
+        obs.trigger("some_event", 1)
+        obs.off("some_event", results.append)
+        await asyncio.sleep(0.05)
+
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    assert results == []
+
+
+def test_on_pattern():
+    """test handlers registered for wildcard patterns are called with the
+    event name after the handlers of the event itself"""
+    obs = Observable()
+
+    results = []
+
+    @obs.on("after_set_*")
+    def pattern_test(event, value):
+        results.append((event, value))
+
+    @obs.on("after_set_x")
+    def some_test(value):
+        results.append(value)
+
+    assert obs.trigger("after_set_x", 1)
+    assert obs.trigger("after_set_y", 2)
+    assert not obs.trigger("before_set_x", 3)
+    assert results == [1, ("after_set_x", 1), ("after_set_y", 2)]
+
+    results.clear()
+    obs.on("**", lambda event, *args: results.append(event))
+    assert obs.trigger("before_set_x", 3)
+    assert obs.trigger("after_set_x", 4)
+    assert results == ["before_set_x", 4, ("after_set_x", 4), "after_set_x"]
+
+    results.clear()
+    obs.off("**")
+    obs.off("after_set_*", pattern_test)
+    assert not obs.trigger("after_set_y", 5)
+    assert obs.trigger("after_set_x", 6)
+    assert results == [6]
+    assert obs.get_handlers("after_set_*") == []
+
+
+def test_trigger_pattern():
+    """test triggering a pattern calls its handlers once, as pattern"""
+    obs = Observable()
+    results = []
+
+    obs.on("after_set_*", lambda event, value: results.append((event, value)))
+    obs.on("**", lambda event, value: results.append(event))
+
+    assert obs.trigger("after_set_*", 1)
+    assert results == [("after_set_*", 1), "after_set_*"]
+
+
+@pytest.mark.parametrize("scope", ["handler", "observable"])
+def test_pattern_executor(scope):
+    """test handlers of wildcard patterns are submitted to executors once
+    and their futures get their results and exceptions"""
+
+    def handler(event, value):
+        if value is None:
+            raise ValueError(event)
+        return event, value * 2
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        obs = Observable(executor=executor if scope == "observable" else None)
+        obs.on("db.*", handler, executor=executor)
+
+        future, = obs.submit("db.insert", 21)
+        assert future.result() == ("db.insert", 42)
+        future, = obs.submit("db.delete", None)
+        assert isinstance(future.exception(), ValueError)
+
+
+def test_off_pattern_handler():
+    """test patterns whose last handler was unregistered aren't matched"""
+    obs = Observable()
+    results = []
+
+    def pattern_test(event, value):
+        results.append(event)
+
+    obs.on("after_set_*", pattern_test)
+    obs.off("after_set_*", pattern_test)
+    assert not obs._patterns
+    assert not obs.trigger("after_set_x", 1)
+
+    obs.on("after_set_*", pattern_test)
+    assert obs.trigger("after_set_x", 2)
+    assert results == ["after_set_x"]
+
+
+def test_batch_registration():
+    """test handlers registered or unregistered during a batch are used
+    for the triggers recorded in it and afterwards"""
+    obs = Observable()
+    results = []
+
+    @obs.on("some_event")
+    def some_test(value):
+        results.append(("some", value))
+
+    obs.trigger("some_event", 0)
+    with obs.batch():
+        assert obs.trigger("some_event", 1)
+        obs.off("some_event", some_test)
+        obs.on("some_event", lambda value: results.append(("other", value)))
+        assert results == [("some", 0)]
+
+    assert results == [("some", 0), ("other", 1)]
+    obs.trigger("some_event", 2)
+    assert results == [("some", 0), ("other", 1), ("other", 2)]
+
+
+def test_batch_events():
+    """test a batch keeps every trigger of ordinary events in order"""
+    obs = Observable()
+    results = []
+    obs.on("row", results.append)
+    obs.on("other", lambda: results.append("other"))
+
+    with obs.batch():
+        for row in range(3):
+            obs.trigger("row", row)
+        obs.trigger("other")
+        obs.trigger("row", 3)
+        assert results == []
+
+    assert results == [0, 1, 2, "other", 3]
+
+
+def test_batch_threads():
+    """test a batch only records the triggers of its own thread"""
+    obs = ThreadSafeObservable()
+    results = []
+    obs.on("some_event", results.append)
+
+    with obs.batch():
+        obs.trigger("some_event", 1)
+        thread = threading.Thread(target=obs.trigger, args=("some_event", 2))
+        thread.start()
+        thread.join()
+        assert results == [2]
+
+    assert results == [2, 1]
+    obs.trigger("some_event", 3)
+    assert results == [2, 1, 3]
+
+
+@pytest.mark.parametrize("cls", [Observable, ThreadSafeObservable, WeakObservable])
+def test_slots(cls):
+    """test Observables have no __dict__ and work when they're created
+    in and used after a batch"""
+    obs = cls()
+    assert not hasattr(obs, "__dict__")
+    assert weakref.ref(obs)() is obs
+    assert obs.trigger("some_event") is False
+    results = []
+
+    def some_test(value):
+        results.append(value)
+
+    with obs.batch():
+        obs.on("some_event", some_test)
+        obs.trigger("some_event", 1)
+    obs.trigger("some_event", 2)
+    assert results == [1, 2]
+
+    obs.off()
+    assert obs.trigger("some_event", 3) is False
+    obs.on("some_event", some_test)
+    obs.trigger("some_event", 4)
+    assert results == [1, 2, 4]
+
+
+_RECORDED = []
+
+
+def _record(value):
+    """module-level handler, so it can be pickled"""
+    _RECORDED.append(value)
+
+
+@pytest.mark.parametrize("clone", [
+    copy.copy, copy.deepcopy, lambda obs: pickle.loads(pickle.dumps(obs)),
+])
+def test_copy_and_pickle(clone):
+    """test copied and unpickled Observables work with and without handlers"""
+    obs = Observable()
+    clone(obs).on("some_event", _record)
+    assert not obs.trigger("some_event", 0)
+
+    obs.on("some_event", _record)
+    obs.on("some_event", _record, priority=1)
+    obs.trigger("some_event", 1)
+    _RECORDED.clear()
+    copied = clone(obs)
+    assert copied.trigger("some_event", 2)
+    copied.on("other_event", _record)
+    assert copied.trigger("other_event", 3)
+    copied.on("some_event", _record)
+    copied.on("*_event", _record)
+    assert _RECORDED == [2, 2, 3]
+
+    _RECORDED.clear()
+    assert obs.trigger("some_event", 4)
+    assert not obs.trigger("other_event", 5)
+    assert obs.get_handlers("some_event") == [_record, _record]
+    assert _RECORDED == [4, 4]
+
+
+def test_on_class():
+    """test class-level handlers are called for all instances with the
+    instance as first argument, before the handlers of the instance"""
+
+    class Model(Observable):
+        __slots__ = ()
+
+    class SubModel(Model):
+        __slots__ = ()
+
+    results = []
+    first, second, sub = Model(), Model(), SubModel()
+
+    @first.on("some_event")
+    def some_test(value):
+        results.append(("instance", value))
+
+    # cached dispatchers are dropped by on_class
+    assert first.trigger("some_event", 0)
+    Model.on_class("some_event", lambda obs, value: results.append((obs, value)))
+    SubModel.on_class("some_event", lambda obs, value: results.append("sub"))
+
+    assert first.trigger("some_event", 1)
+    assert second.trigger("some_event", 2)
+    assert sub.trigger("some_event", 3)
+    assert Observable().trigger("some_event", 4) is False
+    assert results == [
+        ("instance", 0), (first, 1), ("instance", 1), (second, 2), (sub, 3), "sub"
+    ]
+    assert len(SubModel.get_class_handlers("some_event")) == 2
+    assert first.get_handlers("some_event") == [some_test]
+
+    results.clear()
+    SubModel.off_class("some_event")
+    with pytest.raises(EventNotFound):
+        SubModel.off_class("some_event")
+    assert sub.trigger("some_event", 5)
+    Model.off_class()
+    assert first.trigger("some_event", 6)
+    assert second.trigger("some_event", 7) is False
+    assert results == [(sub, 5), ("instance", 6)]
+
+    with pytest.raises(ValueError):
+        Model.on_class("some_*", some_test)
+
+
+def test_on_class_cached_dispatcher():
+    """test instances without handlers cache the class-level dispatcher
+    shared by all instances until class-level handlers change"""
+
+    class Model(Observable):
+        __slots__ = ()
+
+    results = []
+    obs = Model()
+    Model.on_class("some_event", lambda obs, value: results.append(value))
+
+    assert obs.trigger("some_event", 1)
+    dispatch = obs._dispatchers["some_event"]
+    assert obs.trigger("some_event", 2)
+    assert obs._dispatchers["some_event"] is dispatch
+    other = Model()
+    other.dispatcher("some_event")(2)
+    assert other._dispatchers["some_event"] is dispatch
+
+    Model.on_class("some_event", lambda obs, value: results.append("other"))
+    assert obs.trigger("some_event", 3)
+    assert results == [1, 2, 2, 3, "other"]
+
+
+def test_dispatcher_cache():
+    """test only dispatchers are cached, events matching no pattern as
+    None, and class-level changes drop them during batches as well"""
+
+    class Model(Observable):
+        __slots__ = ()
+
+    results = []
+    obs = Model()
+    obs.on("some_*", lambda event, value: results.append(value))
+    assert list(obs.results("some_event", 1)) == [None]
+    assert not obs._dispatchers
+    assert obs.trigger("other_event", 2) is False
+    assert obs._dispatchers == {"other_event": None}
+
+    with obs.batch():
+        Model.on_class("other_event", lambda obs, value: results.append(-value))
+        assert obs.trigger("other_event", 3)
+        assert results == [1]
+    assert results == [1, -3]
+    assert obs.trigger("other_event", 4)
+    assert results == [1, -3, -4]
+
+
+@pytest.mark.parametrize("errors", ["raise", "log"])
+def test_on_class_cached_dispatcher_settings(errors):
+    """test instances without handlers cache the class-level dispatcher
+    with any settings and drop it when handlers are registered"""
+
+    class Model(Observable):
+        __slots__ = ()
+
+    results = []
+    obs = Model(errors=errors)
+    Model.on_class("some_event", lambda obs, value: results.append(value))
+
+    assert obs.trigger("some_event", 1)
+    dispatch = obs._dispatchers["some_event"]
+    assert obs.trigger("some_event", 2)
+    assert obs._dispatchers["some_event"] is dispatch
+
+    obs.on("some_event", lambda value: results.append("instance"))
+    assert obs.trigger("some_event", 3)
+    assert results == [1, 2, 3, "instance"]
+
+
+@pytest.mark.parametrize("errors, instance, hooked", [
+    ("raise", False, False), ("log", False, False), ("log", True, False),
+    ("raise", True, True),
+])
+def test_cached_dispatchers_no_cycles(errors, instance, hooked):
+    """test cached dispatchers don't keep their Observable alive"""
+
+    class Model(Observable):
+        __slots__ = ()
+
+    Model.on_class("some_event", lambda obs: None)
+    obs = Model(errors=errors)
+    if instance:
+        obs.on("some_event", lambda: None)
+    if hooked:
+        obs.add_hook(DispatchHook())
+    ref = weakref.ref(obs)
+
+    gc.disable()
+    try:
+        assert obs.trigger("some_event")
+        assert list(obs.results("some_event"))
+        del obs
+        assert ref() is None
+    finally:
+        gc.enable()
+
+
+def test_on_class_multiple_inheritance():
+    """test classes inherit the class-level handlers of all their bases"""
+
+    class First(Observable):
+        pass
+
+    class Second(Observable):
+        pass
+
+    results = []
+    First.on_class("some_event", lambda obs: results.append("first"))
+    Second.on_class("some_event", lambda obs: results.append("second"))
+
+    class Both(First, Second):
+        pass
+
+    class Later(Both):
+        pass
+
+    assert len(Later.get_class_handlers("some_event")) == 2
+    assert Both().trigger("some_event")
+    assert results == ["second", "first"]
+
+
+def test_priority():
+    """test handlers are called by descending priority and in
+    registration order for equal priorities"""
+    obs = Observable()
+    results = []
+
+    def handler(name):
+        def _handler(*args):
+            results.append(name)
+        return _handler
+
+    low = handler("low")
+    obs.on("some_event", handler("first"))
+    obs.on("some_event", low, priority=-1)
+    obs.on("some_event", handler("high"), priority=10)
+    obs.on("some_event", handler("second"))
+    obs.on("some_event", handler("higher"), priority=10)
+    obs.once("some_event", handler("once"), priority=5)
+    obs.on("some_*", handler("pattern"), priority=1)
+
+    class Model(Observable):
+        pass
+
+    Model.on_class("some_event", handler("class"), priority=5)
+    model = Model()
+    model.on("some_event", handler("instance"), priority=5)
+
+    assert obs.trigger("some_event")
+    assert results == ["high", "higher", "once", "pattern", "first", "second", "low"]
+    assert obs.get_handlers("some_event")[-1] is low
+
+    results.clear()
+    obs.off("some_event", low)
+    obs.trigger("some_event")
+    assert results == ["high", "higher", "pattern", "first", "second"]
+
+    results.clear()
+    model.trigger("some_event")
+    assert results == ["class", "instance"]
+
+    results.clear()
+    twice = handler("twice")
+    obs.on("other_event", twice, priority=1)
+    obs.on("other_event", twice, priority=-1)
+    obs.on("other_event", handler("middle"))
+    obs.trigger("other_event")
+    assert results == ["twice", "middle", "twice"]
+    obs.off("other_event", twice)
+    assert len(obs.get_handlers("other_event")) == 1
+
+    class Listener:
+        def __call__(self):
+            results.append("weak")
+
+    listener = Listener()
+    obs.on("other_event", listener, weak=True, priority=3)
+    del listener
+    gc.collect()
+    obs.trigger("other_event")
+    assert len(obs.get_handlers("other_event")) == 1
+
+
+def test_stop_propagation():
+    """test a handler raising StopPropagation skips the remaining ones"""
+    obs = Observable()
+    results = []
+
+    @obs.on("some_event")
+    def some_test(value):
+        results.append(value)
+        if value > 1:
+            raise StopPropagation()
+
+    obs.on("some_event", lambda value: results.append("other"))
+
+    assert obs.trigger("some_event", 1)
+    assert obs.trigger("some_event", 2)
+    assert results == [1, "other", 2]
+
+    results.clear()
+    obs.dispatcher("some_event")(2)
+    assert obs.trigger_many("some_event", [(1,), (2,), (3,)])
+    assert results == [2, 1, 2, 3, "other"]
+
+    results.clear()
+    futures = obs.submit("some_event", 2)
+    assert len(futures) == 1 and futures[0].result() is None
+    assert results == [2]
+
+
+def test_stop_propagation_batch_handler():
+    """test a batch handler raising StopPropagation in trigger_many skips
+    the remaining handlers for all items"""
+    obs = Observable()
+    results = []
+
+    @obs.on("some_event", batch=True, priority=1)
+    def batch_test(items):
+        results.append(items)
+        raise StopPropagation()
+
+    obs.on("some_event", lambda value: results.append(value))
+
+    assert obs.trigger_many("some_event", [(1,), (2,)])
+    assert results == [[(1,), (2,)]]
+
+
+def test_results():
+    """test results yields return values lazily and reduce reduces them"""
+    obs = Observable()
+    called = []
+
+    def handler(result):
+        def _handler(value):
+            called.append(result)
+            if result == "stop":
+                raise StopPropagation(value)
+            return result
+        return _handler
+
+    obs.on("some_event", handler(1), handler(2))
+    results = obs.results("some_event", 0)
+    assert next(results) == 1
+    assert called == [1]
+    assert list(results) == [2]
+    assert obs.reduce("some_event", operator.add, 10, 0) == 13
+    assert obs.reduce("other_event", operator.add, 10, 0) == 10
+
+    called.clear()
+    obs.on("some_event", handler("stop"), priority=1)
+    assert list(obs.results("some_event", 42)) == [42]
+    assert called == ["stop"]
+
+
+def _failing(results, name, failures):
+    """Returns a handler which appends name to results and raises a
+    ValueError the first failures times it's called"""
+
+    def _handler(value):
+        nonlocal failures
+        results.append(name)
+        if failures:
+            failures -= 1
+            raise ValueError(name)
+
+    return _handler
+
+
+def test_errors_raise():
+    """test exceptions of handlers propagate by default"""
+    obs = Observable()
+    results = []
+    obs.on("some_event", _failing(results, "first", 1), _failing(results, "second", 0))
+
+    with pytest.raises(ValueError):
+        obs.trigger("some_event", 1)
+    assert results == ["first"]
+
+    with pytest.raises(ValueError):
+        Observable(errors="ignore")
+
+
+def test_errors_collect():
+    """test all handlers run and failures are collected and can be retried"""
+    obs = Observable(errors="collect")
+    results = []
+    first, second = _failing(results, "first", 2), _failing(results, "second", 0)
+    third = _failing(results, "third", 1)
+    obs.on("some_event", first, second, third)
+
+    with pytest.raises(DispatchError) as error:
+        obs.trigger("some_event", 1)
+    assert results == ["first", "second", "third"]
+    assert error.value.event == "some_event"
+    assert [handler for handler, _ in error.value.failures] == [first, third]
+    assert [str(exc) for exc in error.value.exceptions] == ["first", "third"]
+
+    results.clear()
+    with pytest.raises(DispatchError) as retry_error:
+        error.value.retry()
+    assert results == ["first", "third"]
+    assert retry_error.value.failures[0][0] is first
+    retry_error.value.retry()
+    assert results == ["first", "third", "first"]
+
+
+def test_errors_dispatch_paths(caplog):
+    """test the error policy applies to trigger_many, results and submit"""
+    obs = Observable(errors="collect")
+    results = []
+    failing = _failing(results, "first", 2)
+    obs.on("some_event", failing, _failing(results, "second", 0))
+
+    with pytest.raises(DispatchError) as error:
+        obs.trigger_many("some_event", [(1,), (2,)])
+    assert results == ["first", "first", "second", "second"]
+    assert [str(exc) for exc in error.value.exceptions] == ["first", "first"]
+    results.clear()
+    error.value.retry()
+    assert results == ["first", "first"]
+
+    obs.errors = "log"
+    results.clear()
+    failing = _failing(results, "first", 1)
+    obs.off("some_event")
+    obs.on("some_event", failing, lambda value: value)
+    assert list(obs.results("some_event", 1)) == [1]
+    assert "some_event failed" in caplog.text
+
+    caplog.clear()
+    obs.off("some_event", failing)
+    obs.on("some_event", _failing(results, "first", 1), priority=1)
+    futures = obs.submit("some_event", 2)
+    assert str(futures[0].exception()) == "first"
+    assert futures[1].result() == 2
+    assert "some_event failed" in caplog.text
+
+
+def test_errors_once_retry():
+    """test failed once handlers are reported as the handler itself, so
+    retry calls it again"""
+    obs = Observable(errors="collect")
+    results = []
+    failing = _failing(results, "once", 1)
+    obs.once("some_event", failing)
+
+    with pytest.raises(DispatchError) as error:
+        obs.trigger("some_event", 1)
+    assert error.value.failures[0][0] is failing
+    error.value.retry()
+    assert results == ["once", "once"]
+    assert not obs.trigger("some_event", 2)
+
+
+@pytest.mark.parametrize("errors", ["collect", "log", "event"])
+def test_errors_deferred(errors, caplog):
+    """test failures of deferred calls are handled according to errors
+    without skipping the other due calls"""
+    obs = Observable(errors=errors)
+    obs.clock = clock = _FakeClock()
+    results = []
+    failing = _failing(results, "first", 1)
+    obs.on("some_event", failing, debounce=1.0)
+    obs.on("other_event", _failing(results, "second", 0), debounce=1.0)
+    obs.on("error", lambda *args: results.append(args))
+
+    obs.trigger("some_event", 1)
+    obs.trigger("other_event", 2)
+    clock.now = 2.0
+    if errors == "collect":
+        with pytest.raises(DispatchError) as error:
+            obs.flush()
+        assert error.value.failures[0][0] is failing
+        assert obs.flush() == 1
+    else:
+        assert obs.flush() == 2
+    assert results[0] == "first" and results[-1] == "second"
+    if errors == "event":
+        assert results[1][:2] == ("some_event", failing)
+    elif errors == "log":
+        assert "some_event failed" in caplog.text
+
+
+def test_errors_log(caplog):
+    """test failures are logged and don't stop other handlers"""
+    obs = Observable()
+    obs.errors = "log"
+    results = []
+    obs.on("some_event", _failing(results, "first", 1), _failing(results, "second", 0))
+
+    assert obs.trigger("some_event", 1)
+    assert results == ["first", "second"]
+    assert "some_event failed" in caplog.text
+
+
+def test_errors_event(caplog):
+    """test failures are routed to the error event"""
+    obs = Observable(errors="event")
+    results = []
+    failing = _failing(results, "first", 1)
+    obs.on("some_event", failing, _failing(results, "second", 0))
+    obs.on("error", lambda *args: results.append(args))
+
+    obs.trigger("some_event", 1)
+    assert results[1] == "second"
+    event, handler, exc = results[2]
+    assert (event, handler, str(exc)) == ("some_event", failing, "first")
+    assert caplog.text == ""
+
+    obs.on("error", _failing(results, "error", 1))
+    obs.on("other_event", _failing(results, "other", 1))
+    obs.trigger("other_event", 1)
+    assert "error failed" in caplog.text
@@ -0,0 +1,48 @@
+import pytest
+
+from observable.patterns import PatternIndex, is_pattern
+
+
+@pytest.mark.parametrize("pattern, event, matches", [
+    ("after_set_*", "after_set_x", True),
+    ("after_set_*", "after_set_", True),
+    ("after_set_*", "before_set_x", False),
+    ("after_set_*", "after_set_x.y", False),
+    ("db.*", "db.insert", True),
+    ("db.*", "db", False),
+    ("db.*.users", "db.insert.users", True),
+    ("db.**", "db", True),
+    ("db.**", "db.insert.users", True),
+    ("db.**", "dbx.insert", False),
+    ("a.**.b", "a.b", True),
+    ("a.**.b", "a.x.y.b", True),
+    ("a.**.b", "a.x.y.c", False),
+    ("**", "anything.at.all", True),
+    ("*.+", "x.+", True),
+])
+def test_match(pattern, event, matches):
+    """test which event names a single pattern matches"""
+    index = PatternIndex()
+    index.add(pattern)
+    assert index.match(event) == ([pattern] if matches else [])
+
+
+def test_match_order():
+    """test matches are returned in the order the patterns were added,
+    and removed patterns don't match anymore"""
+    index = PatternIndex()
+    for pattern in ("db.**", "*.insert", "**", "db.insert"):
+        index.add(pattern)
+
+    assert index.match("db.insert") == ["db.**", "*.insert", "**", "db.insert"]
+
+    index.remove("*.insert")
+    assert "*.insert" not in index
+    assert index.match("db.insert") == ["db.**", "**", "db.insert"]
+
+
+def test_is_pattern():
+    """test only event names with wildcards are patterns"""
+    assert is_pattern("after_set_*")
+    assert is_pattern("db.**")
+    assert not is_pattern("db.insert")
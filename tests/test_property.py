@@ -1,7 +1,7 @@
 import pytest
 
 from observable import Observable
-from observable.property import ObservableProperty
+from observable.property import UNSET, ObservableProperty
 
 
 class _TestObject(Observable):
@@ -205,3 +205,333 @@ def test_custom_observable_attr():
     called = False
     obj.prop
     assert called is True
+
+
+def test_no_listeners_skip_trigger():
+    """Verifies events are only triggered when the Observable may have
+    handlers for them, including wildcard patterns."""
+
+    obj = _TestObject(1)
+    triggered = []
+    obj.trigger = lambda event, *args: triggered.append(event)
+
+    obj.prop = 2
+    assert obj.prop == 2
+    del obj.prop
+    assert triggered == []
+
+    obj.on("after_set_prop", lambda value: None)
+    obj.prop = 3
+    assert obj.prop == 3
+    assert triggered == ["before_set_prop", "after_set_prop"]
+
+    triggered.clear()
+    obj.on("*_get_*", lambda event, *args: None)
+    assert obj.prop == 3
+    assert triggered == ["before_get_prop", "after_get_prop"]
+
+
+def test_no_observable():
+    """Verifies a TypeError is raised when there's no Observable object
+    to trigger events on."""
+
+    class Obj:
+        @ObservableProperty
+        def prop(self):
+            return
+
+    with pytest.raises(TypeError):
+        Obj().prop
+
+
+def test_change_event():
+    """Verifies changing the event of a property and using its setter keep
+    the event names up to date."""
+
+    prop = ObservableProperty.create_with(event="evt")(lambda self: 1)
+    prop.event = "other"
+    prop = prop.setter(lambda self, value: None)
+
+    class Obj(Observable):
+        pass
+
+    Obj.prop = prop
+    obj = Obj()
+
+    @obj.on("after_set_other")
+    def handle(value):
+        nonlocal called
+        called = value
+
+    called = None
+    obj.prop = 42
+    assert called == 42
+
+
+def test_selected_events():
+    """Verifies only the selected events are triggered."""
+
+    class Obj(Observable):
+        def __init__(self):
+            super().__init__()
+            self.value = 0
+
+        @ObservableProperty.create_with(events={"after_set"})
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    obj = Obj()
+    triggered = []
+    obj.on("**", lambda event, *args: triggered.append((event,) + args))
+
+    obj.prop = 42
+    assert obj.prop == 42
+    assert triggered == [("after_set_prop", 42)]
+    assert Obj.prop.events == {"after_set"}
+
+    with pytest.raises(ValueError):
+        ObservableProperty(events={"after_change"})
+
+
+@pytest.mark.parametrize("compare, notified", [
+    ("equality", [(2.0, 1), (3, 2.0)]),
+    ("identity", [(1.0, 1), (2.0, 1.0), (3, 2.0)]),
+    (lambda old, new: int(old) // 2 == int(new) // 2, [(2.0, 1.0)]),
+])
+def test_notify_changed(compare, notified):
+    """Verifies set events are only triggered for changed values and get
+    the old value."""
+
+    class Obj(Observable):
+        def __init__(self):
+            super().__init__()
+            self.value = 1
+
+        @ObservableProperty.create_with(notify="changed", compare=compare)
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    obj = Obj()
+    triggered = []
+    obj.on("after_set_prop", lambda value, old: triggered.append((value, old)))
+
+    for value in (1, 1.0, 2.0, 2.0, 3):
+        obj.prop = value
+        assert obj.value == value
+
+    assert triggered == notified
+
+
+@pytest.mark.parametrize("compare", [
+    "equality", "identity", lambda old, new: old == new,
+])
+def test_notify_changed_unset(compare):
+    """Verifies set events are triggered with UNSET as old value when the
+    getter raises AttributeError."""
+
+    class Obj(Observable):
+        def __init__(self):
+            super().__init__()
+            self.prop = 1
+
+        @ObservableProperty.create_with(notify="changed", compare=compare)
+        def prop(self):
+            return self._value
+
+        @prop.setter
+        def prop(self, value):
+            self._value = value
+
+    triggered = []
+    Obj.on_class("after_set_prop", lambda obj, *args: triggered.append(args))
+    obj = Obj()
+    obj.prop = 1
+    obj.prop = 2
+    assert triggered == [(1, UNSET), (2, 1)]
+
+
+def test_batch():
+    """Verifies events are deferred until the end of a batch and repeated
+    sets of a property are coalesced to the final value."""
+
+    obj = _TestObject(1)
+    triggered = []
+
+    @obj.on("after_set_prop")
+    def handle(value):
+        triggered.append((value, obj.value))
+
+    with obj.batch():
+        obj.prop = 2
+        with obj.batch():
+            obj.prop = 3
+        assert triggered == []
+        obj.prop = 4
+        assert triggered == []
+
+    assert triggered == [(4, 4)]
+
+    triggered.clear()
+    with obj.batch(coalesce=False):
+        obj.prop = 5
+        obj.prop = 6
+    assert triggered == [(5, 6), (6, 6)]
+
+    triggered.clear()
+    with pytest.raises(RuntimeError):
+        with obj.batch():
+            obj.prop = 7
+            raise RuntimeError()
+    assert triggered == [(7, 7)]
+
+    obj.prop = 8
+    assert triggered == [(7, 7), (8, 8)]
+
+
+def test_batch_changed():
+    """Verifies sets coalesced in a batch report the value from before the
+    batch as old value and aren't triggered when they restored it."""
+
+    class Changed(Observable):
+        prop = ObservableProperty(notify="changed")
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.value = 1
+
+        @prop.getter
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    obj = Changed()
+    triggered = []
+    obj.on("after_set_prop", lambda *args: triggered.append(args))
+
+    with obj.batch():
+        obj.prop = 2
+        obj.prop = 3
+    assert triggered == [(3, 1)]
+
+    triggered.clear()
+    with obj.batch():
+        obj.prop = 5
+        obj.prop = 3
+    assert triggered == []
+    assert obj.prop == 3
+
+
+def test_batch_shared_observable():
+    """Verifies sets are only coalesced per holder when several holders
+    share one Observable."""
+
+    shared = Observable()
+
+    class Holder:
+        x = ObservableProperty(observable=shared)
+        y = ObservableProperty(observable=shared, notify="changed")
+
+        def __init__(self, y):
+            self.values = {"x": 0, "y": y}
+
+        @x.getter
+        def x(self):
+            return self.values["x"]
+
+        @x.setter
+        def x(self, value):
+            self.values["x"] = value
+
+        @y.getter
+        def y(self):
+            return self.values["y"]
+
+        @y.setter
+        def y(self, value):
+            self.values["y"] = value
+
+    first, second = Holder(0), Holder(5)
+    triggered = []
+    shared.on("after_set_x", lambda *args: triggered.append(("x",) + args))
+    shared.on("after_set_y", lambda *args: triggered.append(("y",) + args))
+
+    with shared.batch():
+        first.x = 1
+        second.x = 2
+        first.x = 3
+        first.y = 5
+        second.y = 0
+
+    assert triggered == [("x", 3), ("x", 2), ("y", 5, 0), ("y", 0, 5)]
+
+
+def test_slots():
+    """Verifies ObservablePropertys work on classes with __slots__, both
+    on Observables and with a custom Observable object."""
+
+    class SlottedObservable(Observable):
+        __slots__ = ("value",)
+
+        def __init__(self):
+            super().__init__()
+            self.value = 1
+
+        @ObservableProperty
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    class Slotted:
+        __slots__ = ("events", "value")
+
+        def __init__(self):
+            self.events = Observable()
+            self.value = 1
+
+        @ObservableProperty.create_with(observable="events")
+        def prop(self):
+            return self.value
+
+        @prop.setter
+        def prop(self, value):
+            self.value = value
+
+    for obj, observable in ((SlottedObservable(), None), (Slotted(), "events")):
+        observable = obj if observable is None else getattr(obj, observable)
+        assert not hasattr(obj, "__dict__")
+        triggered = []
+        obj.prop = 2
+        observable.on("after_set_prop", triggered.append)
+        obj.prop = 3
+        assert obj.prop == 3
+        assert triggered == [3]
+
+
+def test_on_class():
+    """Verifies class-level handlers are called for the events of all
+    instances, with the instance as first argument."""
+
+    class Model(_TestObject):
+        pass
+
+    triggered = []
+    Model.on_class("after_set_prop", lambda obj, value: triggered.append((obj, value)))
+    first, second = Model(1), Model(1)
+    first.prop = 2
+    second.prop = 3
+    _TestObject(1).prop = 4
+    assert triggered == [(first, 2), (second, 3)]
@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from observable.queued import QueuedObservable
+
+
+def _blocked(obs, event="block"):
+    """Registers a handler for event which blocks a worker until the
+    returned threading.Event is set and returns it along with an event
+    set once the handler was called."""
+
+    release, started = threading.Event(), threading.Event()
+
+    def _block():
+        started.set()
+        release.wait(5)
+
+    obs.on(event, _block)
+    return release, started
+
+
+def test_trigger_is_queued():
+    """test triggers return immediately and workers call the handlers
+    in order"""
+    calls = []
+    with QueuedObservable() as obs:
+        release, started = _blocked(obs)
+        obs.on("some_event", calls.append)
+        assert obs.trigger("block")
+        assert started.wait(5)
+        assert obs.trigger("some_event", 1)
+        assert obs.trigger("some_event", 2)
+        assert calls == []
+        assert obs.queue_stats()["depth"] == 2
+        release.set()
+        assert obs.drain(5)
+        assert calls == [1, 2]
+        assert obs.queue_stats() == {
+            "depth": 0, "max_depth": 2, "pending": 0, "dropped": 0, "maxsize": 1024,
+        }
+    with pytest.raises(RuntimeError):
+        obs.trigger("some_event", 3)
+
+
+@pytest.mark.parametrize("policy, expected, result", [
+    ("drop_oldest", [2, 3], True),
+    ("drop_newest", [1, 2], False),
+])
+def test_drop_policies(policy, expected, result):
+    """test full queues drop either the oldest or the newest event"""
+    calls = []
+    with QueuedObservable(maxsize=2, policy=policy) as obs:
+        release, started = _blocked(obs)
+        obs.on("some_event", calls.append)
+        obs.trigger("block")
+        assert started.wait(5)
+        assert obs.trigger("some_event", 1)
+        assert obs.trigger("some_event", 2)
+        assert obs.trigger("some_event", 3) is result
+        assert obs.queue_stats()["dropped"] == 1
+        release.set()
+        assert obs.drain(5)
+    assert calls == expected
+
+
+def test_block_policy():
+    """test triggers wait for space in a full queue"""
+    calls = []
+    obs = QueuedObservable(maxsize=1)
+    release, started = _blocked(obs)
+    obs.on("some_event", calls.append)
+    obs.trigger("block")
+    assert started.wait(5)
+    obs.trigger("some_event", 1)
+
+    emitter = threading.Thread(target=obs.trigger, args=("some_event", 2))
+    emitter.start()
+    emitter.join(0.05)
+    assert emitter.is_alive()
+    release.set()
+    emitter.join(5)
+    assert obs.close(timeout=5)
+    assert calls == [1, 2]
+    assert obs.queue_stats()["dropped"] == 0
+
+
+def test_trigger_from_handler():
+    """test handlers triggering events into a full queue don't block their
+    worker and can't drain"""
+    results, errors = [], []
+    with QueuedObservable(maxsize=1) as obs:
+        obs.on("b", lambda: results.append("b"))
+
+        @obs.on("a")
+        def _trigger():
+            obs.trigger("b")
+            obs.trigger("b")
+            try:
+                obs.drain(1)
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        obs.trigger("a")
+        assert obs.drain(2)
+        assert obs.queue_stats()["pending"] == 0
+    assert results == ["b", "b"]
+    assert len(errors) == 1
+
+
+def test_close_without_drain():
+    """test close drops queued events unless they should be drained
+    and that failing handlers don't stop the workers"""
+    calls = []
+    obs = QueuedObservable()
+    release, started = _blocked(obs)
+    obs.on("some_event", calls.append)
+    obs.on("failing_event", lambda: 1 / 0)
+    obs.trigger("failing_event")
+    obs.trigger("some_event", 1)
+    assert obs.drain(5)
+    assert calls == [1]
+
+    obs.trigger("block")
+    assert started.wait(5)
+    obs.trigger("some_event", 2)
+    assert not obs.close(drain=False, timeout=0.01)
+    release.set()
+    assert obs.close(timeout=5)
+    assert calls == [1]
+    assert obs.queue_stats()["pending"] == 0
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"maxsize": 0}, {"workers": 0}, {"policy": "unknown"},
+])
+def test_invalid_arguments(kwargs):
+    """test invalid arguments are rejected"""
+    with pytest.raises(ValueError):
+        QueuedObservable(**kwargs)
@@ -0,0 +1,157 @@
+import pytest
+
+from observable import Observable, StopPropagation
+from observable.property import ObservableProperty
+from observable.stats import DispatchHook, Instrumentation, prometheus_text
+
+
+class _FakeClock:
+    """Clock advancing by one millisecond every time it's read."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+def _handler(value, **kw):
+    if value < 0:
+        raise ValueError(value)
+
+
+def _stop(value):
+    raise StopPropagation()
+
+
+def test_stats():
+    """test triggers, handler calls, errors and latencies are
+    recorded per event and handler"""
+    instrumentation = Instrumentation(buckets=(0.0005, 0.005), clock=_FakeClock())
+    obs = Observable()
+    obs.on("some_event", _handler)
+    obs.on("other_event", _stop, _handler)
+    obs.instrumentation = instrumentation
+
+    obs.trigger("some_event", 1)
+    with pytest.raises(ValueError):
+        obs.trigger("some_event", -1)
+    obs.trigger("other_event", 1)
+    obs.trigger("unknown_event", 1)
+
+    name = "{}._handler".format(__name__)
+    stats = instrumentation.stats()
+    assert sorted(stats) == ["other_event", "some_event"]
+    assert stats["some_event"]["triggers"] == 2
+    assert stats["some_event"]["handlers"][name] == {
+        "calls": 2,
+        "errors": 1,
+        "seconds": pytest.approx(0.002),
+        "histogram": [(0.0005, 0), (0.005, 2), (float("inf"), 2)],
+    }
+    assert list(stats["other_event"]["handlers"]) == ["{}._stop".format(__name__)]
+
+    instrumentation.reset()
+    assert instrumentation.stats() == {}
+
+    obs.instrumentation = None
+    obs.trigger("some_event", 1)
+    assert instrumentation.stats() == {}
+    assert obs._dispatchers["some_event"] is _handler
+
+
+def test_prometheus_text():
+    """test statistics are exported in the Prometheus text format"""
+    instrumentation = Instrumentation(buckets=(0.1,))
+    instrumentation.record_trigger('say "hi"')
+    instrumentation.record_call('say "hi"', "greet", 0.5, failed=True)
+
+    text = instrumentation.export(prometheus_text)
+    labels = 'event="say \\"hi\\"",handler="greet"'
+    assert text.splitlines() == [
+        "# HELP observable_triggers_total Number of triggers of an event.",
+        "# TYPE observable_triggers_total counter",
+        'observable_triggers_total{event="say \\"hi\\""} 1',
+        "# HELP observable_handler_calls_total Number of calls of a handler.",
+        "# TYPE observable_handler_calls_total counter",
+        "observable_handler_calls_total{%s} 1" % labels,
+        "# HELP observable_handler_errors_total Number of calls of a handler "
+        "which raised an exception.",
+        "# TYPE observable_handler_errors_total counter",
+        "observable_handler_errors_total{%s} 1" % labels,
+        "# HELP observable_handler_duration_seconds Duration of handler calls "
+        "in seconds.",
+        "# TYPE observable_handler_duration_seconds histogram",
+        'observable_handler_duration_seconds_bucket{%s,le="0.1"} 0' % labels,
+        'observable_handler_duration_seconds_bucket{%s,le="+Inf"} 1' % labels,
+        "observable_handler_duration_seconds_sum{%s} 0.5" % labels,
+        "observable_handler_duration_seconds_count{%s} 1" % labels,
+    ]
+    assert prometheus_text({}) == ""
+
+
+class _RecordingHook(DispatchHook):
+    """Hook recording all calls of before and after."""
+
+    def __init__(self):
+        self.calls = []
+
+    def before(self, event, handler, args, kw):
+        self.calls.append(("before", event, handler, args, kw))
+
+    def after(self, event, handler, args, kw, seconds, exception):
+        assert seconds >= 0
+        self.calls.append(("after", event, handler, args, kw, type(exception)))
+
+
+def test_hooks():
+    """test hooks are called around every handler call of the
+    sampled triggers"""
+    hook, unsampled = _RecordingHook(), _RecordingHook()
+    obs = Observable()
+    obs.on("some_event", _handler)
+    obs.add_hook(hook)
+    obs.add_hook(unsampled, sample_rate=0.0)
+
+    obs.trigger("some_event", 1, key=2)
+    with pytest.raises(ValueError):
+        obs.trigger("some_event", -1)
+    assert hook.calls == [
+        ("before", "some_event", _handler, (1,), {"key": 2}),
+        ("after", "some_event", _handler, (1,), {"key": 2}, type(None)),
+        ("before", "some_event", _handler, (-1,), {}),
+        ("after", "some_event", _handler, (-1,), {}, ValueError),
+    ]
+    assert unsampled.calls == []
+
+    obs.remove_hook(hook)
+    obs.remove_hook(unsampled)
+    with pytest.raises(ValueError):
+        obs.remove_hook(hook)
+    obs.trigger("some_event", 1)
+    assert len(hook.calls) == 4
+    assert obs._dispatchers["some_event"] is _handler
+
+
+def test_global_hooks():
+    """test global hooks trace the handlers of all Observables,
+    including the events of ObservablePropertys"""
+    class Model(Observable):
+        @ObservableProperty
+        def prop(self):
+            return 1
+
+    hook = _RecordingHook()
+    model = Model()
+    model.on("after_get_prop", _handler)
+    Observable.add_global_hook(hook)
+    try:
+        assert model.prop == 1
+    finally:
+        Observable.remove_global_hook(hook)
+    assert model.prop == 1
+    assert [call[:4] for call in hook.calls] == [
+        ("before", "after_get_prop", _handler, (1,)),
+        ("after", "after_get_prop", _handler, (1,)),
+    ]
@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from observable import Observable, ThreadSafeObservable
+from observable.transport import SocketBridge
+
+
+def _receiver(obs, event):
+    """Registers a handler for event and returns a queue receiving the
+    arguments of its calls."""
+
+    calls = queue.Queue()
+    obs.on(event, lambda *args, **kw: calls.put((args, kw)))
+    return calls
+
+
+def _wait_for(predicate, timeout=5):
+    """Waits until predicate returns True."""
+
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+@pytest.mark.parametrize("serializer", [None, pickle])
+def test_bridge(tmp_path, serializer):
+    """test triggers of forwarded events reach the Observables of
+    other bridges, but aren't forwarded back"""
+    kwargs = {} if serializer is None else {"serializer": serializer}
+    first, second = ThreadSafeObservable(), ThreadSafeObservable()
+    with SocketBridge(first, str(tmp_path), ["cache.*"], **kwargs) as first_bridge, \
+            SocketBridge(second, str(tmp_path), ["cache.*"], **kwargs) as second_bridge:
+        _wait_for(lambda: first_bridge.peers == [second_bridge.path])
+        assert second_bridge.peers == [first_bridge.path]
+        calls = _receiver(second, "cache.invalidate")
+        echoes = _receiver(first, "cache.invalidate")
+        unforwarded = _receiver(second, "other")
+
+        first.trigger("other", 1)
+        first.trigger("cache.invalidate", "user", id=1)
+        first.trigger("cache.invalidate", "group", id=2)
+        assert calls.get(timeout=5) == (("user",), {"id": 1})
+        assert calls.get(timeout=5) == (("group",), {"id": 2})
+        assert first_bridge.flush(5)
+        assert second_bridge.flush(5)
+
+    assert unforwarded.empty()
+    assert [echoes.get_nowait() for _ in range(2)] == [
+        (("user",), {"id": 1}), (("group",), {"id": 2}),
+    ]
+    assert echoes.empty()
+    assert os.listdir(str(tmp_path)) == []
+    assert not first.is_registered("cache.*", first_bridge._forward)
+
+
+def test_handler_triggers_forwarded(tmp_path):
+    """test events triggered by handlers of received events are
+    forwarded, while the received events themselves aren't"""
+    first, second = ThreadSafeObservable(), ThreadSafeObservable()
+    second.on("request", lambda key: second.trigger("reply", key))
+    replies = _receiver(first, "reply")
+    requests = _receiver(first, "request")
+    with SocketBridge(first, str(tmp_path), ["request", "reply"]) as first_bridge, \
+            SocketBridge(second, str(tmp_path), ["request", "reply"]) as second_bridge:
+        _wait_for(lambda: first_bridge.peers == [second_bridge.path])
+        _wait_for(lambda: second_bridge.peers == [first_bridge.path])
+        first.trigger("request", "user")
+        assert replies.get(timeout=5) == (("user",), {})
+        assert first_bridge.flush(5)
+        assert second_bridge.flush(5)
+
+    assert requests.get_nowait() == (("user",), {})
+    assert requests.empty()
+
+
+def test_malformed_datagrams(tmp_path):
+    """test malformed datagrams and peers outside of the directory are
+    logged and skipped without stopping the receiver"""
+    obs = ThreadSafeObservable()
+    calls = _receiver(obs, "event")
+    with SocketBridge(obs, str(tmp_path), []) as bridge:
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        with sender:
+            outside = str(tmp_path / "other" / "peer.sock")
+            for datagram in (
+                    b"E[1]", b"E[[1, [], {}]]", b"E{", b"H\xff\xfe", b"B\xff",
+                    b"X", b"H" + outside.encode(),
+                    b"H" + str(tmp_path / "peer").encode(),
+                    b'E[["event",[1],{}]]'):
+                sender.sendto(datagram, bridge.path)
+        assert calls.get(timeout=5) == ((1,), {})
+        assert bridge.peers == []
+
+
+def test_directory_permissions(tmp_path):
+    """test directories accessible by other users are rejected"""
+    directory = tmp_path / "events"
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SocketBridge(Observable(), str(directory), [])
+
+
+def test_dropped_events(tmp_path):
+    """test events which can't be sent are dropped without affecting
+    the other events of a batch"""
+    first, second = Observable(), ThreadSafeObservable()
+    calls = _receiver(second, "event")
+    with SocketBridge(first, str(tmp_path), ["event"], linger=0.01) as first_bridge, \
+            SocketBridge(second, str(tmp_path), []) as second_bridge:
+        _wait_for(lambda: first_bridge.peers == [second_bridge.path])
+        first.trigger("event", 1)
+        first.trigger("event", lambda: None)
+        first.trigger("event", b"x" * 100000)
+        first.trigger("event", 2)
+        assert first_bridge.flush(5)
+        assert calls.get(timeout=5) == ((1,), {})
+        assert calls.get(timeout=5) == ((2,), {})
+        assert first_bridge.dropped == 2
+
+
+def _child(directory, ready, results):
+    obs = ThreadSafeObservable()
+    done = threading.Event()
+
+    @obs.on("cache.invalidate")
+    def invalidate(key):
+        results.put((os.getpid(), key))
+        done.set()
+
+    with SocketBridge(obs, directory, ["cache.*"]):
+        ready.set()
+        done.wait(5)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_bridge_processes(tmp_path):
+    """test triggers reach handlers in other processes"""
+    context = multiprocessing.get_context("fork")
+    ready, results = context.Event(), context.Queue()
+    child = context.Process(target=_child, args=(str(tmp_path), ready, results))
+    child.start()
+    try:
+        assert ready.wait(5)
+        obs = Observable()
+        with SocketBridge(obs, str(tmp_path), ["cache.*"]):
+            obs.trigger("cache.invalidate", "user")
+            assert results.get(timeout=5) == (child.pid, "user")
+    finally:
+        child.join(5)
+    assert child.exitcode == 0